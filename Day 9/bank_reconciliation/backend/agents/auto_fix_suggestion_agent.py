@@ -1,58 +1,123 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from typing import Dict
-from config import GOOGLE_API_KEY
-import json
+from typing import Dict, Optional, Tuple
+from json_stream import parse_json_response
+from llm_client import get_chat_model
+import math
 import re
 
+# Placeholders a cluster suggestion may use; they are filled in per discrepancy
+FIX_PARAMETERS = ("bank_transaction_id", "book_transaction_id", "description", "date",
+                  "amount", "bank_amount", "book_amount", "difference")
+
+
+def description_template(description) -> str:
+    """Lowercased description without numbers or punctuation, e.g. 'Wire fee 25.00' -> 'wire fee #'"""
+    text = re.sub(r"\d+(?:[.,]\d+)*", "#", str(description or "").lower())
+    text = re.sub(r"[^a-z# ]+", " ", text)
+    return " ".join(text.split())
+
+
+def _fix_amount(discrepancy: Dict) -> Optional[float]:
+    for field in ("bank_amount", "book_amount", "amount"):
+        try:
+            if discrepancy.get(field) is not None:
+                return float(discrepancy[field])
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def cluster_key(discrepancy) -> Tuple:
+    """(type, sign, description template, amount order of magnitude) shared by similar discrepancies"""
+    discrepancy = discrepancy if isinstance(discrepancy, dict) else {"description": discrepancy}
+    amount = _fix_amount(discrepancy)
+    sign = "unknown" if amount is None else "credit" if amount > 0 else "debit" if amount < 0 else "zero"
+    magnitude = int(math.floor(math.log10(abs(amount)))) if amount else None
+    return (str(discrepancy.get("type", "unknown")), sign, description_template(discrepancy.get("description")), magnitude)
+
+
+def fix_parameters(discrepancy) -> Dict:
+    """Values for the FIX_PARAMETERS placeholders of one discrepancy"""
+    discrepancy = discrepancy if isinstance(discrepancy, dict) else {}
+    parameters = {name: discrepancy.get(name) for name in FIX_PARAMETERS}
+    for name in ("amount", "bank_amount", "book_amount"):
+        if parameters[name] is None and name == "amount":
+            parameters[name] = _fix_amount(discrepancy)
+        if isinstance(parameters[name], (int, float)):
+            parameters[name] = f"{abs(parameters[name]):.2f}"
+    if discrepancy.get("bank_amount") is not None and discrepancy.get("book_amount") is not None:
+        parameters["difference"] = f"{abs(float(discrepancy['bank_amount']) - float(discrepancy['book_amount'])):.2f}"
+    return parameters
+
+
+def instantiate_fix(template: str, discrepancy) -> str:
+    """Fill a cluster suggestion's placeholders with one discrepancy's values"""
+    parameters = fix_parameters(discrepancy)
+
+    def fill(placeholder):
+        name = placeholder.group(1)
+        if name not in parameters:
+            return placeholder.group(0)
+        return str(parameters[name]).strip() if parameters[name] is not None else "n/a"
+
+    return re.sub(r"\{(\w+)\}", fill, template)
+
+
 class AutoFixSuggestionAgent:
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=GOOGLE_API_KEY,
-            temperature=0.7
-        )
-
-    def suggest_fixes(self, discrepancy: Dict) -> Dict:
-        """Suggests fixes for a given discrepancy using LLM"""
-        prompt = PromptTemplate(
-            input_variables=["discrepancy"],
+        self.cluster_prompt = PromptTemplate(
+            input_variables=["discrepancy_type", "sign", "description_template", "amount_range", "parameters"],
             template="""
-            Analyze the following bank reconciliation discrepancy and suggest a precise fix or a detailed next action. 
+            Suggest a precise fix or detailed next action for every bank reconciliation discrepancy of this kind.
             Focus on practical accounting or investigation steps. If a journal entry is suggested, include the debits and credits.
-            
-            Discrepancy: {discrepancy}
-            
+
+            Discrepancy type: {discrepancy_type}
+            Direction: {sign}
+            Description pattern (numbers shown as #): {description_template}
+            Amount range: {amount_range}
+
+            The suggestion is reused for each discrepancy of this kind, so refer to item specifics only through
+            these placeholders, written in curly braces: {parameters}.
+
             Return the suggestion in JSON format, with a key 'suggestion' containing the text. Example:
             {{
-                "suggestion": "Investigate missing invoice, then make a journal entry: Debit Accounts Receivable, Credit Service Revenue."
+                "suggestion": "Record the {{amount}} bank fee from {{bank_transaction_id}}: Debit Bank Charges, Credit Cash."
             }}
             """
         )
-        llm_response = self.llm.invoke(
-            prompt.format(
-                discrepancy=str(discrepancy)
-            )
-        )
+        # Cluster suggestions already generated by this process; across runs the
+        # identical cluster prompts are served by the shared LLM response cache
+        self._cluster_suggestions = {}
 
-        json_string = llm_response.content.strip()
-        if json_string.startswith('```json'):
-            json_string = json_string[len('```json'):]
-        if json_string.endswith('```'):
-            json_string = json_string[:-len('```')]
-        json_string = json_string.strip()
+    @property
+    def llm(self):
+        """The shared chat model for the calling event loop, created on first use"""
+        return get_chat_model()
 
-        json_match = re.search(r'(\{.*\}|\[.*\])', json_string, re.DOTALL)
-        if json_match:
-            json_string = json_match.group(1)
-        else:
-            print(f"No valid JSON object or array found in LLM response for Auto-Fix Suggestion: {json_string}")
-            return {"suggestion": "Could not generate a specific fix."}
+    async def asuggest_cluster_fix(self, key: Tuple) -> str:
+        """One parameterized suggestion for all discrepancies sharing a cluster_key"""
+        if key in self._cluster_suggestions:
+            return self._cluster_suggestions[key]
+        discrepancy_type, sign, template, magnitude = key
+        amount_range = "unknown" if magnitude is None else f"{10.0 ** magnitude:.2f} to {10.0 ** (magnitude + 1):.2f}"
+        llm_response = await self.llm.ainvoke(
+            self.cluster_prompt.format(
+                discrepancy_type=discrepancy_type,
+                sign=sign,
+                description_template=template or "none",
+                amount_range=amount_range,
+                parameters=", ".join("{" + name + "}" for name in FIX_PARAMETERS)
+            )
+        )
+        suggestion = self._parse_suggestion(llm_response)
+        if not isinstance(suggestion, str):
+            raise ValueError(f"No suggestion in LLM response for cluster {key}")
+        self._cluster_suggestions[key] = suggestion
+        return suggestion
 
-        try:
-            parsed_json = json.loads(json_string)
-            return parsed_json.get("suggestion", "Could not parse suggestion.")
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON for Auto-Fix Suggestion from LLM: {e}")
-            print(f"Problematic JSON string for Auto-Fix Suggestion: {json_string}")
-            return {"suggestion": "Could not generate a specific fix due to parsing error."} 
\ No newline at end of file
+    def _parse_suggestion(self, llm_response) -> Optional[str]:
+        """The 'suggestion' text of a response, or None if it has none"""
+        parsed_json = parse_json_response(llm_response.content)
+        if not isinstance(parsed_json, dict):
+            return None
+        return parsed_json.get("suggestion")
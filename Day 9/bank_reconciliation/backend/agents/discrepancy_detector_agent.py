@@ -1,119 +1,197 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
+import numpy as np
 import pandas as pd
-from typing import List, Dict
-from config import GOOGLE_API_KEY
-import json
-import re
+from typing import List, Dict, Optional
+from config import DISCREPANCY_REASON_BATCH_SIZE
+from json_stream import parse_json_response
+from llm_client import get_chat_model
+from matching import DATE_WINDOW_DAYS
+from table_encoding import encode_rows, report_prompt
+
+# Discrepancy types whose rule-based reason can be improved by the LLM
+AMBIGUOUS_TYPES = ("amount_mismatch", "fuzzy_match")
+# Local match types whose score rates description similarity; LLM matches carry no match_type and
+# count too. Tolerance and assignment scores also reward close dates and amounts, so a score
+# below 100 there is a match inside the configured tolerance, not a fuzzy one
+FUZZY_MATCH_TYPES = ("description",)
+REASON_COLUMNS = ["type", "bank_transaction_id", "book_transaction_id", "description", "book_description",
+                  "bank_amount", "book_amount", "reason"]
 
 class DiscrepancyDetectorAgent:
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=GOOGLE_API_KEY,
-            temperature=0.7
-        )
-
-    def detect_unreconciled_items(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict]) -> List[Dict]:
-        """Detects unreconciled items and provides initial reasons using LLM"""
-        prompt = PromptTemplate(
-            input_variables=["bank_df", "books_df", "matches"],
+        self.reason_prompt = PromptTemplate(
+            input_variables=["items"],
             template="""
-            Analyze these transactions. Identify any items from Bank Transactions or Book Transactions that are not found in the Current Matches.
-            For each identified unreconciled item, provide a brief reason for the discrepancy (e.g., missing, date mismatch, amount mismatch).
-            
-            Bank Transactions:
-            {bank_df}
-            
-            Book Transactions:
-            {books_df}
-            
-            Current Matches:
-            {matches}
-            
-            Return the unreconciled items and their reasons in JSON format. Each item in the list should include:
-            - "bank_transaction_id" (if from bank) or "book_transaction_id" (if from books)
-            - "description"
-            - "amount"
-            - "type" (e.g., "missing_in_books", "missing_in_bank", "amount_mismatch")
-            - "reason"
-            - "bank_amount" (for amount mismatches)
-            - "book_amount" (for amount mismatches)
-            
-            Example of expected JSON format:
-            {{
-                "unreconciled_items": [
-                    {{
-                        "bank_transaction_id": "BANK123",
-                        "book_transaction_id": "BOOK123",
-                        "description": "Payment to Vendor",
-                        "type": "amount_mismatch",
-                        "bank_amount": -100.00,
-                        "book_amount": -150.00,
-                        "reason": "Amount mismatch: Bank shows -100.00, Book shows -150.00"
-                    }}
-                ]
-            }}
+            These bank reconciliation discrepancies were found by rules. For each one, write a short,
+            specific explanation of the most likely cause (e.g. bank fee, partial payment, timing difference,
+            duplicate entry, data entry error) in place of the generic reason.
+            The list has a header line and one pipe-delimited row per discrepancy.
+
+            Discrepancies:
+            {items}
+
+            Return JSON with one entry per discrepancy, using the index from the list. Example:
+            {{"reasons": [{{"index": 0, "reason": "Bank charged a 2.50 wire fee not yet recorded in the books"}}]}}
             """
         )
-        llm_response = self.llm.invoke(
-            prompt.format(
-                bank_df=bank_df.to_string(),
-                books_df=books_df.to_string(),
-                matches=str(matches)
-            )
+
+    @property
+    def llm(self):
+        """The shared chat model for the calling event loop, created on first use"""
+        return get_chat_model()
+
+    def enrich_reasons(self, discrepancies: List[Dict], failures: Optional[List[str]] = None) -> List[Dict]:
+        """Ask the LLM for specific reasons for the ambiguous discrepancies only.
+
+        Amount mismatches and fuzzy matches are sent in batches of
+        DISCREPANCY_REASON_BATCH_SIZE; missing entries and date gaps keep their
+        rule-based reason. Items whose reason could not be generated are left as they were,
+        and the failed batches are recorded in ``failures``.
+        """
+        ambiguous = [index for index, item in enumerate(discrepancies) if item.get("type") in AMBIGUOUS_TYPES]
+        enriched = list(discrepancies)
+        for start in range(0, len(ambiguous), DISCREPANCY_REASON_BATCH_SIZE):
+            batch = ambiguous[start:start + DISCREPANCY_REASON_BATCH_SIZE]
+            rows = pd.DataFrame([discrepancies[index] for index in batch]).reindex(columns=REASON_COLUMNS)
+            rows.insert(0, "index", range(len(batch)))
+            formatted_prompt = self.reason_prompt.format(items=encode_rows(rows))
+            report_prompt("discrepancy_reasons", formatted_prompt, len(batch))
+            try:
+                parsed_json = parse_json_response(self.llm.invoke(formatted_prompt).content, "reasons")
+            except Exception as e:
+                print(f"Error enriching discrepancy reasons: {e}")
+                if failures is not None:
+                    failures.append(f"discrepancy reasons for {len(batch)} items: {e}")
+                continue
+            reasons = parsed_json.get("reasons", []) if isinstance(parsed_json, dict) else parsed_json or []
+            for entry in reasons:
+                if not isinstance(entry, dict) or not entry.get("reason"):
+                    continue
+                position = entry.get("index")
+                if isinstance(position, int) and 0 <= position < len(batch):
+                    index = batch[position]
+                    enriched[index] = {**enriched[index], "reason": str(entry["reason"])}
+        return enriched
+
+    def detect(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict],
+               grouped_matches: Optional[List[Dict]] = None, tolerance_days: int = DATE_WINDOW_DAYS) -> List[Dict]:
+        """Detect discrepancies deterministically, without an LLM call.
+
+        Unmatched rows are an anti-join of each frame against the transaction
+        ids referenced by the matches (local or LLM, pairwise or grouped).
+        Matched pairs are then classified with NumPy masks on the amounts and
+        dates looked up from the frames: amount mismatches first, then dates
+        more than ``tolerance_days`` apart (closer dates are within what the
+        matcher accepts), then description-only (fuzzy) matches among the
+        description and LLM matches.
+        """
+        # LLM output is not guaranteed to be a list of dicts
+        matches = [match for match in matches if isinstance(match, dict)]
+        grouped_matches = grouped_matches or []
+        matched_bank = _matched_ids(
+            [match.get("bank_transaction_id") for match in matches]
+            + [bank_id for group in grouped_matches for bank_id in group.get("bank_transaction_ids", [])]
         )
-        
-        json_string = llm_response.content.strip()
-        if json_string.startswith('```json'):
-            json_string = json_string[len('```json'):]
-        if json_string.endswith('```'):
-            json_string = json_string[:-len('```')]
-        json_string = json_string.strip()
-
-        json_match = re.search(r'(\{.*\}|\[.*\])', json_string, re.DOTALL)
-        if json_match:
-            json_string = json_match.group(1)
-        else:
-            print(f"No valid JSON object or array found in LLM response for Discrepancy Detector: {json_string}")
+        matched_books = _matched_ids(
+            [match.get("book_transaction_id") for match in matches]
+            + [book_id for group in grouped_matches for book_id in group.get("book_transaction_ids", [])]
+        )
+
+        missing_in_books = bank_df[~_id_strings(bank_df["transaction_id"]).isin(matched_bank).to_numpy()]
+        missing_in_bank = books_df[~_id_strings(books_df["transaction_id"]).isin(matched_books).to_numpy()]
+        discrepancies = _records(pd.DataFrame({
+            "type": "missing_in_books",
+            "bank_transaction_id": missing_in_books["transaction_id"].astype(str),
+            "description": missing_in_books["description"].astype(str),
+            "date": _date_strings(missing_in_books["date"]),
+            "bank_amount": missing_in_books["amount"],
+            "reason": "No matching entry in books",
+        }))
+        discrepancies += _records(pd.DataFrame({
+            "type": "missing_in_bank",
+            "book_transaction_id": missing_in_bank["transaction_id"].astype(str),
+            "description": missing_in_bank["description"].astype(str),
+            "date": _date_strings(missing_in_bank["date"]),
+            "book_amount": missing_in_bank["amount"],
+            "reason": "No matching entry in bank",
+        }))
+        discrepancies += self._pair_discrepancies(bank_df, books_df, matches, tolerance_days)
+        return discrepancies
+
+    @staticmethod
+    def _pair_discrepancies(bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict],
+                            tolerance_days: int = DATE_WINDOW_DAYS) -> List[Dict]:
+        if not matches:
             return []
+        pairs = pd.DataFrame(matches)
+        bank = _lookup(bank_df, pairs.get("bank_transaction_id"))
+        books = _lookup(books_df, pairs.get("book_transaction_id"))
+        known = bank["amount"].notna().to_numpy() & books["amount"].notna().to_numpy()
 
-        try:
-            parsed_json = json.loads(json_string)
-            if isinstance(parsed_json, dict):
-                return parsed_json.get("unreconciled_items", [])
-            elif isinstance(parsed_json, list):
-                return parsed_json
-            else:
-                return []
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON for Discrepancy Detector from LLM: {e}")
-            print(f"Problematic JSON string for Discrepancy Detector: {json_string}")
+        bank_amount = bank["amount"].to_numpy(dtype="float64")
+        book_amount = books["amount"].to_numpy(dtype="float64")
+        bank_date = pd.to_datetime(bank["date"], errors="coerce").to_numpy()
+        book_date = pd.to_datetime(books["date"], errors="coerce").to_numpy()
+        # Local matches carry a 0-100 score, LLM matches only a 0-1 confidence
+        score = pd.to_numeric(pairs["score"], errors="coerce") if "score" in pairs else pd.Series(np.nan, index=pairs.index)
+        if "confidence" in pairs:
+            score = score.fillna(pd.to_numeric(pairs["confidence"], errors="coerce") * 100)
+        score = score.fillna(100).to_numpy()
+
+        amount_mismatch = known & ~np.isclose(bank_amount, book_amount, rtol=0, atol=0.005)
+        day_gap = np.abs((book_date - bank_date) / np.timedelta64(1, "D"))
+        # NaN gaps (missing dates) compare False
+        date_mismatch = known & ~amount_mismatch & (day_gap > tolerance_days)
+        match_type = pairs["match_type"] if "match_type" in pairs else pd.Series(None, index=pairs.index, dtype="object")
+        scored_on_description = (match_type.isna() | match_type.isin(FUZZY_MATCH_TYPES)).to_numpy()
+        fuzzy = known & ~amount_mismatch & ~date_mismatch & scored_on_description & (score < 100)
+        flagged = amount_mismatch | date_mismatch | fuzzy
+        if not flagged.any():
             return []
 
-    def detect(self, bank_df, books_df, matches, unmatched_bank, unmatched_books):
-        discrepancies = []
-        # Unmatched bank entries
-        for idx in unmatched_bank:
-            discrepancies.append({
-                "type": "missing_in_books",
-                "bank_row": bank_df.loc[idx].to_dict(),
-                "reason": "No matching entry in books"
-            })
-        # Unmatched book entries
-        for idx in unmatched_books:
-            discrepancies.append({
-                "type": "missing_in_bank",
-                "book_row": books_df.loc[idx].to_dict(),
-                "reason": "No matching entry in bank"
-            })
-        # Mismatches in matches
-        for match in matches:
-            if match['score'] < 100:
-                discrepancies.append({
-                    "type": "fuzzy_match",
-                    "bank_row": bank_df.loc[match['bank_index']].to_dict(),
-                    "book_row": books_df.loc[match['book_index']].to_dict(),
-                    "reason": f"Fuzzy match with score {match['score']}"
-                })
-        return discrepancies 
\ No newline at end of file
+        reasons = np.select(
+            [amount_mismatch, date_mismatch],
+            [
+                "Amount mismatch: Bank shows " + pd.Series(bank_amount).map("{:.2f}".format)
+                + ", Book shows " + pd.Series(book_amount).map("{:.2f}".format),
+                "Date mismatch: recorded " + pd.Series(day_gap).map("{:.0f}".format) + " day(s) apart",
+            ],
+            "Fuzzy match with score " + pd.Series(score).map("{:g}".format),
+        )
+        types = np.select([amount_mismatch, date_mismatch], ["amount_mismatch", "date_mismatch"], "fuzzy_match")
+        return _records(pd.DataFrame({
+            "type": types,
+            "bank_transaction_id": bank["transaction_id"].astype(str).to_numpy(),
+            "book_transaction_id": books["transaction_id"].astype(str).to_numpy(),
+            "description": bank["description"].astype(str).to_numpy(),
+            "book_description": books["description"].astype(str).to_numpy(),
+            "date": _date_strings(bank["date"]).to_numpy(),
+            "bank_amount": bank_amount,
+            "book_amount": book_amount,
+            "reason": reasons,
+        })[flagged])
+
+
+def _id_strings(ids) -> pd.Series:
+    """Transaction ids as stripped strings (missing ids stay missing), so LLM-echoed ids match the source rows"""
+    ids = pd.Series(ids, dtype="object")
+    return ids.where(ids.isna(), ids.astype(str).str.strip())
+
+
+def _matched_ids(ids) -> pd.Index:
+    return pd.Index(_id_strings(ids).dropna())
+
+
+def _lookup(df: pd.DataFrame, ids) -> pd.DataFrame:
+    """Rows of df for each id in ids (all-NaN rows for unknown ids), in order"""
+    keyed = df.assign(_id=_id_strings(df["transaction_id"]).to_numpy()).drop_duplicates("_id").set_index("_id")
+    return keyed.reindex(_id_strings(ids if ids is not None else []).to_numpy())
+
+
+def _date_strings(dates: pd.Series) -> pd.Series:
+    return pd.to_datetime(dates, errors="coerce").dt.strftime("%Y-%m-%d")
+
+
+def _records(df: pd.DataFrame) -> List[Dict]:
+    """Frame rows as JSON-ready dicts, with missing values as None"""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
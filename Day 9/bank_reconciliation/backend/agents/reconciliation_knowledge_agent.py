@@ -1,13 +1,29 @@
 from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
+from langchain.retrievers import ContextualCompressionRetriever
 import os
 from dotenv import load_dotenv
-from config import GOOGLE_API_KEY
+from config import KNOWLEDGE_BASE_DIR, KNOWLEDGE_BASE_DB_PATH, EMBEDDING_BATCH_SIZE
+from config import KNOWLEDGE_BASE_INDEX_PATH, KNOWLEDGE_RETRIEVAL_K, KNOWLEDGE_VECTOR_TIMEOUT_SECONDS, KNOWLEDGE_VECTOR_COOLDOWN_SECONDS
+from config import LLM_MAX_CONCURRENCY, KNOWLEDGE_BATCH_QUESTIONS_PER_PROMPT, KNOWLEDGE_BATCH_CHUNKS_PER_PROMPT
+from config import KNOWLEDGE_CONTEXT_TOKEN_BUDGET, KNOWLEDGE_DUPLICATE_THRESHOLD
+from context_compression import ContextCompressor, drop_near_duplicates
+from knowledge_base import sync_knowledge_base
+from hybrid_retrieval import BM25Index, HybridRetriever, RetrievalStats, chunk_key
+from json_stream import parse_json_response
+from typing import Dict, List
+import asyncio
+from functools import cached_property
+from llm_client import get_chat_model
+from llm_cache import astream_with_cache
 
 load_dotenv()
 
+# Characters of each retrieved chunk sent to the client as a source snippet
+SOURCE_SNIPPET_CHARS = 300
+
 class ReconciliationKnowledgeAgent:
     def __init__(self):
         # Initialize embeddings
@@ -16,33 +32,192 @@ class ReconciliationKnowledgeAgent:
             google_api_key=os.getenv("GOOGLE_API_KEY")
         )
         
-        # Initialize vector store
+        # Initialize vector store, persisted so embeddings survive restarts
         self.vector_store = Chroma(
             collection_name="reconciliation_knowledge",
-            embedding_function=self.embeddings
+            embedding_function=self.embeddings,
+            persist_directory=KNOWLEDGE_BASE_DB_PATH
+        )
+        
+        # Lexical index over the same chunks; answers on its own if embeddings are unavailable
+        self.lexical_index = BM25Index.load_or_build(KNOWLEDGE_BASE_INDEX_PATH, KNOWLEDGE_BASE_DIR)
+        self.retrieval_stats = RetrievalStats()
+        self.retriever = HybridRetriever(
+            lexical_index=self.lexical_index,
+            vector_store=self.vector_store,
+            k=KNOWLEDGE_RETRIEVAL_K,
+            fetch_k=2 * KNOWLEDGE_RETRIEVAL_K,
+            vector_timeout=KNOWLEDGE_VECTOR_TIMEOUT_SECONDS,
+            vector_cooldown=KNOWLEDGE_VECTOR_COOLDOWN_SECONDS,
+            stats=self.retrieval_stats
+        )
+        # Overlapping neighbours merged, near-duplicates dropped, re-ranked and cut to the token budget
+        self.compressor = ContextCompressor(
+            token_budget=KNOWLEDGE_CONTEXT_TOKEN_BUDGET,
+            duplicate_threshold=KNOWLEDGE_DUPLICATE_THRESHOLD,
+            lexical_index=self.lexical_index
+        )
+        self.context_retriever = ContextualCompressionRetriever(
+            base_compressor=self.compressor,
+            base_retriever=self.retriever
         )
         
-        # Initialize LLM
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=GOOGLE_API_KEY,
-            temperature=0.7,
-            convert_system_message_to_human=True
+        # Same wording as the default "stuff" prompt, shared by the chain and the streaming path
+        self.qa_prompt = PromptTemplate(
+            input_variables=["context", "question"],
+            template="""Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Helpful Answer:"""
         )
         
-        # Initialize QA chain
-        self.qa_chain = RetrievalQA.from_chain_type(
+        # Several questions over one shared context, answered as a JSON array
+        self.batch_prompt = PromptTemplate(
+            input_variables=["context", "questions"],
+            template="""Use the following pieces of context to answer each numbered question. If the context does not answer a question, say that you don't know for that question, don't try to make up an answer.
+
+{context}
+
+Questions:
+{questions}
+
+Return only JSON of the form {{"answers": [{{"index": <question number>, "answer": "<answer>"}}]}} with one entry per question."""
+        )
+
+    @property
+    def llm(self):
+        """The shared chat model for the calling event loop, created on first use"""
+        return get_chat_model()
+
+    @cached_property
+    def qa_chain(self) -> RetrievalQA:
+        """RetrievalQA over the compressed hybrid retriever, built on the first query"""
+        return RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
-            retriever=self.vector_store.as_retriever(),
-            return_source_documents=True
+            retriever=self.context_retriever,
+            return_source_documents=True,
+            chain_type_kwargs={"prompt": self.qa_prompt}
         )
     
     def add_documents(self, documents):
         """Add documents to the vector store."""
         self.vector_store.add_documents(documents)
+
+    def sync(self, knowledge_base_dir: str = KNOWLEDGE_BASE_DIR) -> dict:
+        """Embed new or changed knowledge base files and drop removed ones."""
+        stats = sync_knowledge_base(
+            self.vector_store, knowledge_base_dir, KNOWLEDGE_BASE_DB_PATH, EMBEDDING_BATCH_SIZE
+        )
+        print(f"Knowledge base sync: {stats}")
+        self.lexical_index = BM25Index.load_or_build(KNOWLEDGE_BASE_INDEX_PATH, knowledge_base_dir)
+        self.retriever.lexical_index = self.lexical_index
+        self.compressor.lexical_index = self.lexical_index
+        return stats
     
     def query(self, question: str) -> str:
         """Query the knowledge base with a question."""
         result = self.qa_chain({"query": question})
-        return result["result"] 
\ No newline at end of file
+        return result["result"]
+
+    async def astream_answer(self, question: str):
+        """Yield the retrieved sources first, then the answer token by token as Gemini produces it."""
+        docs = await self.context_retriever.ainvoke(question)
+        yield {"event": "sources", "data": [
+            {"source": doc.metadata.get("source"), "snippet": doc.page_content[:SOURCE_SNIPPET_CHARS]}
+            for doc in docs
+        ]}
+        prompt = self.qa_prompt.format(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=question
+        )
+        answer = []
+        async for chunk in astream_with_cache(self.llm, prompt):
+            if chunk.content:
+                answer.append(chunk.content)
+                yield {"event": "token", "data": chunk.content}
+        yield {"event": "done", "answer": "".join(answer)}
+
+    def _group_questions(self, contexts: List[List]) -> List[List[int]]:
+        """Greedily put questions whose retrieved chunks overlap into the same prompt.
+
+        Each question joins the open group it shares the most chunks with, as
+        long as the group stays within the per-prompt question and chunk limits.
+        """
+        groups = []
+        for index, docs in enumerate(contexts):
+            keys = {chunk_key(doc) for doc in docs}
+            best, best_overlap = None, -1
+            for group in groups:
+                overlap = len(keys & group["keys"])
+                fits = (len(group["questions"]) < KNOWLEDGE_BATCH_QUESTIONS_PER_PROMPT
+                        and len(group["keys"] | keys) <= KNOWLEDGE_BATCH_CHUNKS_PER_PROMPT)
+                if fits and overlap > best_overlap:
+                    best, best_overlap = group, overlap
+            if best is None:
+                best = {"questions": [], "keys": set()}
+                groups.append(best)
+            best["questions"].append(index)
+            best["keys"] |= keys
+        return [group["questions"] for group in groups]
+
+    async def aanswer_batch(self, questions: List[str]) -> List[Dict]:
+        """Answer many questions with one batched retrieval and a few multi-question prompts.
+
+        Retrieval embeds every distinct question in a single call. Questions
+        sharing context are grouped, each chunk appears once per prompt, and
+        answers are returned in the order of ``questions``.
+        """
+        distinct = list(dict.fromkeys(questions))
+        contexts = await asyncio.to_thread(self.retriever.retrieve_batch, distinct)
+        contexts = [
+            list(self.compressor.compress_documents(docs, question))
+            for docs, question in zip(contexts, distinct)
+        ]
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+        async def answer_group(group: List[int]) -> Dict[int, str]:
+            docs = {}
+            for index in group:
+                for doc in contexts[index]:
+                    docs.setdefault(chunk_key(doc), doc)
+            # Neighbours merged differently for two questions can still overlap
+            docs = drop_near_duplicates(list(docs.values()), KNOWLEDGE_DUPLICATE_THRESHOLD)
+            prompt = self.batch_prompt.format(
+                context="\n\n".join(doc.page_content for doc in docs),
+                questions="\n".join(f"{number}. {distinct[index]}" for number, index in enumerate(group, start=1))
+            )
+            async with semaphore:
+                response = await self.llm.ainvoke(prompt)
+            parsed_json = parse_json_response(response.content, "answers")
+            answers = {}
+            for item in parsed_json.get("answers", []) if isinstance(parsed_json, dict) else parsed_json or []:
+                if isinstance(item, dict) and isinstance(item.get("index"), int) and 1 <= item["index"] <= len(group):
+                    answers[group[item["index"] - 1]] = str(item.get("answer", ""))
+            # Anything the model skipped is asked on its own with the same context
+            for index in group:
+                if index not in answers:
+                    async with semaphore:
+                        single = await self.llm.ainvoke(self.qa_prompt.format(
+                            context="\n\n".join(doc.page_content for doc in contexts[index]),
+                            question=distinct[index]
+                        ))
+                    answers[index] = single.content
+            return answers
+
+        groups = self._group_questions(contexts)
+        print(f"Batch QA: {len(questions)} questions, {len(distinct)} distinct, {len(groups)} prompts")
+        answers = {}
+        for group_answers in await asyncio.gather(*(answer_group(group) for group in groups)):
+            answers.update(group_answers)
+        position = {question: index for index, question in enumerate(distinct)}
+        return [
+            {
+                "question": question,
+                "answer": answers[position[question]],
+                "sources": sorted({doc.metadata.get("source") for doc in contexts[position[question]]} - {None})
+            }
+            for question in questions
+        ]
@@ -1,38 +1,112 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
+import math
+import numpy as np
 import pandas as pd
-from typing import List, Dict
-from config import GOOGLE_API_KEY
+from typing import List, Dict, Tuple
+from json_stream import aiter_json_array
+from llm_cache import astream_with_cache
+from llm_client import get_chat_model
+from table_encoding import CHARS_PER_TOKEN, encode_table, estimate_tokens, report_prompt
 
 class TransactionMatchingAgent:
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=GOOGLE_API_KEY,
-            temperature=0.7
-        )
-
-    def match_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame) -> List[Dict]:
-        """Match transactions using LLM-based fuzzy/exact matching"""
-        prompt = PromptTemplate(
+        self.prompt = PromptTemplate(
             input_variables=["bank_transactions", "book_transactions"],
             template="""
-            Compare these transactions and find matches:
+            Compare these transactions and find matches.
+            Each table has a header line and one pipe-delimited row per transaction; amounts are in integer cents.
+
             Bank Transactions:
             {bank_transactions}
-            
+
             Book Transactions:
             {book_transactions}
-            
-            Return matches in JSON format with confidence scores.
+
+            Return matches in JSON format with confidence scores. Each match should include:
+            "bank_transaction_id", "book_transaction_id", "description_match", "book_description",
+            "bank_amount", "book_amount" (in currency units, i.e. cents / 100), "amount_match" (true/false)
+            and "confidence" (0 to 1).
+            Example: {{"matches": [{{"bank_transaction_id": "BANK004", "book_transaction_id": "BOOK004",
+            "description_match": "Internet Bill", "book_description": "Monthly Internet Service",
+            "bank_amount": -75.00, "book_amount": -175.00, "amount_match": false, "confidence": 0.7}}]}}
             """
         )
-        bank_str = bank_df.to_string()
-        books_str = books_df.to_string()
-        response = self.llm.invoke(
-            prompt.format(
-                bank_transactions=bank_str,
-                book_transactions=books_str
-            )
+
+    @property
+    def llm(self):
+        """The shared chat model for the calling event loop, created on first use"""
+        return get_chat_model()
+
+    def _format_prompt(self, bank_df: pd.DataFrame, books_df: pd.DataFrame) -> str:
+        return self.prompt.format(
+            bank_transactions=encode_table(bank_df),
+            book_transactions=encode_table(books_df)
         )
-        return response 
\ No newline at end of file
+
+    def _reported_prompt(self, bank_df: pd.DataFrame, books_df: pd.DataFrame) -> str:
+        prompt = self._format_prompt(bank_df, books_df)
+        report_prompt("transaction_matching", prompt, len(bank_df) + len(books_df))
+        return prompt
+
+    def match_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame) -> List[Dict]:
+        """Match transactions using LLM-based fuzzy/exact matching"""
+        return self.llm.invoke(self._reported_prompt(bank_df, books_df))
+
+    async def amatch_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame):
+        """Async variant of match_transactions for running several windows concurrently"""
+        return await self.llm.ainvoke(self._reported_prompt(bank_df, books_df))
+
+    async def astream_matches(self, bank_df: pd.DataFrame, books_df: pd.DataFrame):
+        """Yield matches one by one as the LLM finishes writing each of them"""
+        chunks = astream_with_cache(self.llm, self._reported_prompt(bank_df, books_df))
+        async for match in aiter_json_array(chunks, "matches"):
+            yield match
+
+    def estimate_tokens(self, bank_df: pd.DataFrame, books_df: pd.DataFrame) -> int:
+        """Approximate prompt size in tokens for the given frames"""
+        return estimate_tokens(self._format_prompt(bank_df, books_df))
+
+    def partition(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, token_budget: int,
+                  overlap_days: int) -> List[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """Split both frames into date windows whose prompts fit within token_budget.
+
+        Bank rows are partitioned into consecutive date ranges; each window gets
+        the book rows dated within ``overlap_days`` of its range, so neighbouring
+        windows share book rows near their boundaries.
+        """
+        bank_dates = pd.to_datetime(bank_df["date"], errors="coerce")
+        book_dates = pd.to_datetime(books_df["date"], errors="coerce")
+        bank_sorted = bank_df.iloc[np.argsort(bank_dates.to_numpy(), kind="stable")]
+        books_sorted = books_df.iloc[np.argsort(book_dates.to_numpy(), kind="stable")]
+        bank_days = np.sort(bank_dates.to_numpy())
+        book_days = np.sort(book_dates.to_numpy())
+        overlap = np.timedelta64(overlap_days, "D")
+
+        # Size windows in rows from the average rendered row length of both frames
+        overhead = len(self.prompt.format(bank_transactions="", book_transactions=""))
+        sample = pd.concat([bank_df.head(50), books_df.head(50)], ignore_index=True)
+        row_tokens = math.ceil(len(encode_table(sample)) / max(len(sample), 1) / CHARS_PER_TOKEN) + 1
+        max_rows = max(2, (token_budget - overhead // CHARS_PER_TOKEN) // row_tokens)
+
+        def book_range(start: int, end: int) -> Tuple[int, int]:
+            lo = np.searchsorted(book_days, bank_days[start] - overlap, side="left")
+            hi = np.searchsorted(book_days, bank_days[end - 1] + overlap, side="right")
+            return lo, hi
+
+        windows = []
+        start = 0
+        while start < len(bank_sorted):
+            # Largest end such that bank rows plus their book window fit in max_rows
+            lo_end, hi_end = start + 1, min(len(bank_sorted), start + max_rows)
+            while lo_end < hi_end:
+                mid = (lo_end + hi_end + 1) // 2
+                book_lo, book_hi = book_range(start, mid)
+                if (mid - start) + (book_hi - book_lo) <= max_rows:
+                    lo_end = mid
+                else:
+                    hi_end = mid - 1
+            book_lo, book_hi = book_range(start, lo_end)
+            if book_hi > book_lo:
+                windows.append((bank_sorted.iloc[start:lo_end], books_sorted.iloc[book_lo:book_hi]))
+            start = lo_end
+        return windows
@@ -1,11 +1,25 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 import pandas as pd
-from reconciliation import BankReconciliation
+from ingest import missing_columns
+from reconciliation import BankReconciliation, ReconciliationJob, MATCHING_MODES, STREAM_STAGES
+from matching import DATE_WINDOW_DAYS
+from result_cache import ResultCache
+from llm_cache import get_response_cache
+from job_queue import JobQueue, JobStore
+from singleflight import SingleFlight
+from config import RESULT_CACHE_PATH, RESULT_CACHE_MEMORY_ITEMS, RESULT_CACHE_MAX_BYTES, RECONCILIATION_WORKERS
+from config import JOB_WORKERS, JOB_LEASE_SECONDS, JOB_STORE_PATH, KNOWLEDGE_BASE_SYNC_ON_STARTUP
 import os
-from typing import Dict, List
-import tempfile
-from agents.reconciliation_knowledge_agent import ReconciliationKnowledgeAgent
+from typing import Dict, List, Tuple
+import json
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import io
 
 app = FastAPI()
@@ -21,48 +35,187 @@ app.add_middleware(
 
 # Initialize reconciliation engine
 reconciliation_engine = BankReconciliation()
-agent = ReconciliationKnowledgeAgent()
+result_cache = ResultCache(RESULT_CACHE_PATH, RESULT_CACHE_MEMORY_ITEMS, RESULT_CACHE_MAX_BYTES)
+# The knowledge agent (embeddings, Chroma, BM25 index) is built on first use
+knowledge_agent = None
+knowledge_agent_lock = threading.Lock()
 
-async def _process_files_and_call_reconciliation(bank_statement: UploadFile, books: UploadFile, reconciliation_func, *args_for_reconciliation_func):
+# Concurrent identical requests share one computation
+in_flight = SingleFlight()
+jobs_lock = threading.Lock()
+
+# Streaming endpoints send newline-delimited JSON or server-sent events
+STREAM_FORMATS = ("ndjson", "sse")
+
+# The reconciliation pipeline is synchronous (pandas, blocking LLM calls), so it
+# runs on a bounded pool instead of the event loop; /health and other requests
+# stay responsive and at most RECONCILIATION_WORKERS reconciliations run at once
+reconciliation_executor = ThreadPoolExecutor(max_workers=RECONCILIATION_WORKERS, thread_name_prefix="reconciliation")
+
+def get_knowledge_agent():
+    """The process-wide ReconciliationKnowledgeAgent, created by the first caller"""
+    global knowledge_agent
+    with knowledge_agent_lock:
+        if knowledge_agent is None:
+            from agents.reconciliation_knowledge_agent import ReconciliationKnowledgeAgent
+            knowledge_agent = ReconciliationKnowledgeAgent()
+        return knowledge_agent
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_queue.start()
+
+@app.on_event("startup")
+async def sync_knowledge_base():
+    """Opt-in: embed changed knowledge base files in the background (single-worker deployments only)"""
+    if not KNOWLEDGE_BASE_SYNC_ON_STARTUP:
+        return
+
+    def sync():
+        try:
+            get_knowledge_agent().sync()
+        except Exception as e:
+            print(f"Knowledge base sync failed: {e}")
+
+    threading.Thread(target=sync, name="knowledge-base-sync", daemon=True).start()
+
+async def _in_pool(func, *args):
+    """Run a blocking call on the reconciliation pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(reconciliation_executor, partial(func, *args))
+
+def _validate_uploads(bank_content: bytes, books_content: bytes):
+    if len(bank_content) == 0 or len(books_content) == 0:
+        raise HTTPException(status_code=400, detail="One or both files are empty")
+    for name, content in (("bank_statement", bank_content), ("books", books_content)):
+        missing = missing_columns(content)
+        if missing:
+            raise HTTPException(status_code=400, detail=f"{name} is missing required columns: {', '.join(missing)}")
+
+def _get_job(bank_content: bytes, books_content: bytes, mode: str, tolerance_days: int):
+    """Return the cache key and the (possibly cached) reconciliation job for these uploads"""
+    _validate_uploads(bank_content, books_content)
+
+    key = result_cache.key(bank_content, books_content, mode, tolerance_days)
+    # Held while creating, so concurrent requests for new uploads share one job
+    with jobs_lock:
+        job = result_cache.get_memory(key)
+        if job is None:
+            job = ReconciliationJob(
+                reconciliation_engine, mode=mode, tolerance_days=tolerance_days,
+                load_frames=lambda: reconciliation_engine.load_bytes(bank_content, books_content),
+                executor=reconciliation_executor
+            )
+            snapshot = result_cache.get_disk(key)
+            if snapshot:
+                job.restore(snapshot)
+            result_cache.put_memory(key, job)
+    return key, job
+
+def _save_job(key: str, job: ReconciliationJob, computed_before: set):
+    """Persist newly computed stages; a degraded job is also dropped from memory so the next request retries it"""
+    snapshot = job.snapshot()
+    if set(snapshot) != computed_before:
+        result_cache.put_disk(key, snapshot)
+    if job.degraded:
+        result_cache.discard_memory(key, job)
+
+def _read_job(bank_content: bytes, books_content: bytes, mode: str, tolerance_days: int, read_job):
+    """Blocking part of a request: run the job stages read_job needs and persist new ones"""
+    key, job = _get_job(bank_content, books_content, mode, tolerance_days)
+
+    computed_before = set(job.snapshot())
+    result = read_job(job)
+    _save_job(key, job, computed_before)
+    return result
+
+async def _run_reconciliation_job(bank_statement: UploadFile, books: UploadFile, mode: str, tolerance_days: int,
+                                  operation: str, read_job):
+    """Return read_job(job) for the reconciliation job of these uploads, reusing cached stages.
+
+    Identical requests (same uploads, parameters and operation) that arrive
+    while one is running wait for its result instead of running again.
+    """
     try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            bank_path = os.path.join(temp_dir, "bank_statement.csv")
-            books_path = os.path.join(temp_dir, "books.csv")
-            
-            bank_content = await bank_statement.read()
-            with open(bank_path, "wb") as f:
-                f.write(bank_content)
-            
-            books_content = await books.read()
-            with open(books_path, "wb") as f:
-                f.write(books_content)
-            
-            if os.path.getsize(bank_path) == 0 or os.path.getsize(books_path) == 0:
-                raise HTTPException(status_code=400, detail="One or both files are empty")
-            
-            bank_df, books_df = reconciliation_engine.load_data(bank_path, books_path)
-
-            # If additional args are needed, they should be pre-calculated or passed through here.
-            # For now, assuming basic calls or internal dependencies are handled within reconciliation_func
-            return reconciliation_func(bank_df, books_df, *args_for_reconciliation_func)
-            
+        bank_content = await bank_statement.read()
+        books_content = await books.read()
+        key = result_cache.key(bank_content, books_content, mode, tolerance_days, operation)
+        return await in_flight.do(
+            key, lambda: _in_pool(_read_job, bank_content, books_content, mode, tolerance_days, read_job)
+        )
+
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _encode_event(event: Dict, format: str) -> str:
+    """One streamed event as an NDJSON line or a server-sent event"""
+    line = json.dumps(jsonable_encoder(event))
+    if format == "sse":
+        return f"event: {event['event']}\ndata: {line}\n\n"
+    return line + "\n"
+
+async def _stream_reconciliation_job(bank_statement: UploadFile, books: UploadFile, mode: str, tolerance_days: int,
+                                     stages: Tuple[str, ...], format: str) -> StreamingResponse:
+    """Stream the job's events for the given stages as NDJSON lines or server-sent events"""
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream format '{format}', expected one of {STREAM_FORMATS}")
+    bank_content = await bank_statement.read()
+    books_content = await books.read()
+    key, job = await _in_pool(_get_job, bank_content, books_content, mode, tolerance_days)
+    encode = partial(_encode_event, format=format)
+
+    async def events():
+        # snapshot() takes the job's threading lock, so it runs on the pool rather than the event loop
+        computed_before = set(await _in_pool(job.snapshot))
+        try:
+            async for event in job.stream(stages):
+                yield encode(event)
+        except Exception as e:
+            print(f"Error streaming reconciliation: {e}")
+            yield encode({"event": "error", "detail": str(e)})
+        await _in_pool(_save_job, key, job, computed_before)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+def _run_queued_job(job_id: str, bank_content: bytes, books_content: bytes, mode: str, tolerance_days: int, progress):
+    """Run every stage of a background job, reporting progress as each one finishes"""
+    key, job = _get_job(bank_content, books_content, mode, tolerance_days)
+    computed_before = set(job.snapshot())
+    stages = (
+        ("match", ReconciliationJob.matches, lambda output: len(output["matches"]) + len(output["grouped_matches"])),
+        ("detect", ReconciliationJob.unreconciled, lambda output: len(output["unreconciled"])),
+        ("suggest", ReconciliationJob.suggestions, lambda output: len(output["auto_fixes"])),
+    )
+    for stage, run_stage, count in stages:
+        started = time.time()
+        progress(stage, status="running", started=started)
+        output = run_stage(job)
+        progress(stage, status="completed", items=count(output), seconds=round(time.time() - started, 3))
+    _save_job(key, job, computed_before)
+    return job.result()
+
+job_queue = JobQueue(JobStore(JOB_STORE_PATH), _run_queued_job, JOB_WORKERS, JOB_LEASE_SECONDS)
+
+def _validate_mode(mode: str):
+    if mode not in MATCHING_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown matching mode '{mode}', expected one of {MATCHING_MODES}")
+
 @app.post("/reconciliation/match")
 async def match_reconciliation(
     bank_statement: UploadFile = File(...),
-    books: UploadFile = File(...)
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes")
 ) -> Dict:
     """Process and return only matched transactions"""
+    _validate_mode(mode)
     try:
-        def _func(bank_df, books_df):
-            matches = reconciliation_engine.process_match_reconciliation(bank_df, books_df)
-            print(f"API endpoint matches: {matches}")  # Debug print
-            return matches  # This should already be a dict with 'matches' key
-        return await _process_files_and_call_reconciliation(bank_statement, books, _func)
+        # job.matches() is already a dict with 'matches' and 'grouped_matches' keys
+        return await _run_reconciliation_job(bank_statement, books, mode, tolerance_days, "match", ReconciliationJob.matches)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         print(f"Error in match_reconciliation: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -70,14 +223,16 @@ async def match_reconciliation(
 @app.post("/reconciliation/unmatched")
 async def unmatched_reconciliation(
     bank_statement: UploadFile = File(...),
-    books: UploadFile = File(...)
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes")
 ) -> Dict:
     """Process and return only unmatched transactions"""
+    _validate_mode(mode)
     try:
-        def _func(bank_df, books_df):
-            matches = reconciliation_engine.process_match_reconciliation(bank_df, books_df)
-            return reconciliation_engine.process_unmatched_reconciliation(bank_df, books_df, matches)
-        return await _process_files_and_call_reconciliation(bank_statement, books, _func)
+        return await _run_reconciliation_job(bank_statement, books, mode, tolerance_days, "unmatched", ReconciliationJob.unreconciled)
+    except HTTPException as e:
+        raise e
     except Exception as e:
         print(f"Error in unmatched_reconciliation: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -85,23 +240,152 @@ async def unmatched_reconciliation(
 @app.post("/reconciliation/suggestions")
 async def suggestions_for_fixes(
     bank_statement: UploadFile = File(...),
-    books: UploadFile = File(...)
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes")
 ) -> Dict:
     """Process and return auto-fix suggestions for unreconciled items"""
-    def _func(bank_df, books_df):
-        matches = reconciliation_engine.process_match_reconciliation(bank_df, books_df)
-        return {"auto_fixes": reconciliation_engine.process_suggestions_for_fixes(bank_df, books_df, matches)}
-    return await _process_files_and_call_reconciliation(bank_statement, books, _func)
+    _validate_mode(mode)
+    return await _run_reconciliation_job(bank_statement, books, mode, tolerance_days, "suggestions", ReconciliationJob.suggestions)
+
+@app.post("/reconciliation/full")
+async def full_reconciliation(
+    bank_statement: UploadFile = File(...),
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes")
+) -> Dict:
+    """Process and return matches, unreconciled items and auto-fix suggestions in a single pass"""
+    _validate_mode(mode)
+    return await _run_reconciliation_job(bank_statement, books, mode, tolerance_days, "full", ReconciliationJob.result)
+
+@app.post("/reconciliation/match/stream")
+async def match_reconciliation_stream(
+    bank_statement: UploadFile = File(...),
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes"),
+    format: str = Query("ndjson", description=f"Stream format, one of {STREAM_FORMATS}")
+):
+    """Stream matched transactions, deterministic matches first"""
+    _validate_mode(mode)
+    return await _stream_reconciliation_job(bank_statement, books, mode, tolerance_days, ("matches",), format)
+
+@app.post("/reconciliation/unmatched/stream")
+async def unmatched_reconciliation_stream(
+    bank_statement: UploadFile = File(...),
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes"),
+    format: str = Query("ndjson", description=f"Stream format, one of {STREAM_FORMATS}")
+):
+    """Stream unreconciled items as they are detected"""
+    _validate_mode(mode)
+    return await _stream_reconciliation_job(bank_statement, books, mode, tolerance_days, ("unreconciled",), format)
+
+@app.post("/reconciliation/suggestions/stream")
+async def suggestions_for_fixes_stream(
+    bank_statement: UploadFile = File(...),
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes"),
+    format: str = Query("ndjson", description=f"Stream format, one of {STREAM_FORMATS}")
+):
+    """Stream auto-fix suggestions as each one is generated"""
+    _validate_mode(mode)
+    return await _stream_reconciliation_job(bank_statement, books, mode, tolerance_days, ("suggestions",), format)
+
+@app.post("/reconciliation/full/stream")
+async def full_reconciliation_stream(
+    bank_statement: UploadFile = File(...),
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes"),
+    format: str = Query("ndjson", description=f"Stream format, one of {STREAM_FORMATS}")
+):
+    """Stream matches, unreconciled items and auto-fix suggestions in a single pass"""
+    _validate_mode(mode)
+    return await _stream_reconciliation_job(bank_statement, books, mode, tolerance_days, STREAM_STAGES, format)
+
+@app.post("/reconciliation/jobs", status_code=202)
+async def submit_reconciliation_job(
+    bank_statement: UploadFile = File(...),
+    books: UploadFile = File(...),
+    mode: str = Query("llm", description=f"Matching mode, one of {MATCHING_MODES}"),
+    tolerance_days: int = Query(DATE_WINDOW_DAYS, ge=0, description="Max bank/book date gap for the local modes")
+) -> Dict:
+    """Queue a full reconciliation and return its job id immediately"""
+    _validate_mode(mode)
+    bank_content = await bank_statement.read()
+    books_content = await books.read()
+    _validate_uploads(bank_content, books_content)
+    job_id = await _in_pool(job_queue.submit, bank_content, books_content, mode, tolerance_days)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/reconciliation/jobs/{job_id}")
+async def reconciliation_job_status(job_id: str) -> Dict:
+    """Status and per-stage progress of a job, plus its result once completed"""
+    job = await _in_pool(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the shared LLM response cache and request coalescing"""
+    response_cache = get_response_cache()
+    return {
+        "llm_response_cache": response_cache.stats() if response_cache else None,
+        "request_coalescing": in_flight.stats()
+    }
+
+@app.get("/knowledge/stats")
+async def knowledge_stats():
+    """Retrieval latency per path (lexical, vector, hybrid, lexical-only) and vector fallbacks"""
+    agent = await _in_pool(get_knowledge_agent)
+    return agent.retrieval_stats.snapshot()
+
 @app.get("/ask-knowledge")
 def ask_knowledge(question: str):
     try:
-        answer = agent.query(question)
+        answer = get_knowledge_agent().query(question)
         return {"answer": answer}
     except Exception as e:
-        return {"error": str(e)} 
\ No newline at end of file
+        return {"error": str(e)}
+
+@app.post("/ask-knowledge/batch")
+async def ask_knowledge_batch(questions: List[str] = Body(..., embed=True)):
+    """Answer a list of questions with shared retrieval; answers come back in the same order"""
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    try:
+        agent = await _in_pool(get_knowledge_agent)
+        return {"answers": await agent.aanswer_batch(questions)}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/ask-knowledge/stream")
+async def ask_knowledge_stream(
+    question: str,
+    format: str = Query("ndjson", description=f"Stream format, one of {STREAM_FORMATS}")
+):
+    """Stream the retrieved sources, then the answer tokens as they are generated"""
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream format '{format}', expected one of {STREAM_FORMATS}")
+
+    async def events():
+        try:
+            agent = await _in_pool(get_knowledge_agent)
+            async for event in agent.astream_answer(question):
+                yield _encode_event(event, format)
+        except Exception as e:
+            print(f"Error streaming knowledge answer: {e}")
+            yield _encode_event({"event": "error", "detail": str(e)}, format)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type) 
\ No newline at end of file
@@ -3,4 +3,64 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") 
\ No newline at end of file
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") 
+
+# Prompt size above which LLM matching is split into concurrent date windows
+MATCH_TOKEN_BUDGET = int(os.getenv("MATCH_TOKEN_BUDGET", "8000"))
+# Maximum number of LLM requests in flight at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# In "llm" mode, let the LLM rewrite the reasons of ambiguous discrepancies (in batches of this size)
+DISCREPANCY_LLM_REASONS = os.getenv("DISCREPANCY_LLM_REASONS", "true").lower() in ("1", "true", "yes")
+DISCREPANCY_REASON_BATCH_SIZE = int(os.getenv("DISCREPANCY_REASON_BATCH_SIZE", "50"))
+# Fix suggestions are filled in for at most this many members of a discrepancy cluster per chunk
+FIX_CLUSTER_CHUNK_SIZE = int(os.getenv("FIX_CLUSTER_CHUNK_SIZE", "100"))
+# Worker threads that run the synchronous reconciliation pipeline off the API event loop
+RECONCILIATION_WORKERS = int(os.getenv("RECONCILIATION_WORKERS", "4"))
+
+# Background reconciliation jobs: worker threads and SQLite job store
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A running job whose worker has not heartbeated for this long is handed to another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_STORE_PATH = os.getenv(
+    "JOB_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "cache", "jobs.sqlite3")
+)
+
+# Reconciliation result cache: in-memory LRU size and on-disk SQLite location/size cap
+RESULT_CACHE_PATH = os.getenv(
+    "RESULT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "cache", "reconciliation_results.sqlite3")
+)
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "32"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Prompt-level LLM response cache shared by all agents
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "cache", "llm_responses.sqlite3")
+)
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ITEMS = int(os.getenv("LLM_CACHE_MAX_ITEMS", "10000"))
+
+# Knowledge base: source .txt files, persistent Chroma directory and embedding batch size
+KNOWLEDGE_BASE_DIR = os.getenv(
+    "KNOWLEDGE_BASE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "knowledge_base")
+)
+KNOWLEDGE_BASE_DB_PATH = os.getenv("KNOWLEDGE_BASE_DB_PATH", os.path.join(KNOWLEDGE_BASE_DIR, "chroma_db"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Re-sync the knowledge base with its source files when the API starts. Off by default: every
+# worker would sync into the same Chroma directory at once; run scripts/initialize_knowledge_base.py instead
+KNOWLEDGE_BASE_SYNC_ON_STARTUP = os.getenv("KNOWLEDGE_BASE_SYNC_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+# Hybrid retrieval: saved BM25 index, chunks per answer and how long to wait for the vector path
+KNOWLEDGE_BASE_INDEX_PATH = os.getenv("KNOWLEDGE_BASE_INDEX_PATH", os.path.join(KNOWLEDGE_BASE_DB_PATH, "bm25_index.json"))
+KNOWLEDGE_RETRIEVAL_K = int(os.getenv("KNOWLEDGE_RETRIEVAL_K", "4"))
+KNOWLEDGE_VECTOR_TIMEOUT_SECONDS = float(os.getenv("KNOWLEDGE_VECTOR_TIMEOUT_SECONDS", "3"))
+KNOWLEDGE_VECTOR_COOLDOWN_SECONDS = float(os.getenv("KNOWLEDGE_VECTOR_COOLDOWN_SECONDS", "30"))
+# Batch question answering: questions and distinct context chunks per multi-question prompt
+KNOWLEDGE_BATCH_QUESTIONS_PER_PROMPT = int(os.getenv("KNOWLEDGE_BATCH_QUESTIONS_PER_PROMPT", "8"))
+KNOWLEDGE_BATCH_CHUNKS_PER_PROMPT = int(os.getenv("KNOWLEDGE_BATCH_CHUNKS_PER_PROMPT", "12"))
+# Retrieved context is merged, de-duplicated and re-ranked, then cut to this many tokens
+KNOWLEDGE_CONTEXT_TOKEN_BUDGET = int(os.getenv("KNOWLEDGE_CONTEXT_TOKEN_BUDGET", "1200"))
+KNOWLEDGE_DUPLICATE_THRESHOLD = float(os.getenv("KNOWLEDGE_DUPLICATE_THRESHOLD", "0.8"))
@@ -0,0 +1,158 @@
+import hashlib
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+
+from hybrid_retrieval import tokenize
+from knowledge_base import CHUNK_OVERLAP
+from table_encoding import CHARS_PER_TOKEN, estimate_tokens
+
+# Words per shingle when comparing chunks for near-duplicates
+SHINGLE_SIZE = 5
+# Shortest text overlap treated as the splitter's chunk overlap when merging neighbours
+MIN_MERGE_OVERLAP = 20
+# Don't keep a truncated tail smaller than this many tokens
+MIN_TAIL_TOKENS = 40
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``"""
+    for size in range(min(len(left), len(right), 2 * CHUNK_OVERLAP), MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_neighbors(docs: List[Document]) -> List[Document]:
+    """Join chunks that were consecutive in the same file, keeping their overlap once.
+
+    The merged chunk takes the place of its best-ranked part.
+    """
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        if "position" in doc.metadata:
+            by_source.setdefault(doc.metadata.get("source"), []).append((doc.metadata["position"], rank, doc))
+
+    merged, absorbed = {}, set()
+    for parts in by_source.values():
+        parts.sort(key=lambda part: part[0])
+        run = [parts[0]]
+        for part in parts[1:] + [None]:
+            if part is not None and part[0] == run[-1][0] + 1:
+                run.append(part)
+                continue
+            if len(run) > 1:
+                text = run[0][2].page_content
+                for _, _, doc in run[1:]:
+                    size = _overlap(text, doc.page_content)
+                    text += doc.page_content[size:] if size else "\n" + doc.page_content
+                first = min(rank for _, rank, _ in run)
+                metadata = {**run[0][2].metadata, "positions": [position for position, _, _ in run]}
+                metadata["chunk_hash"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                merged[first] = Document(page_content=text, metadata=metadata)
+                absorbed.update(rank for _, rank, _ in run)
+            run = [part]
+
+    result = []
+    for rank, doc in enumerate(docs):
+        if rank in merged:
+            result.append(merged[rank])
+        elif rank not in absorbed:
+            result.append(doc)
+    return result
+
+
+def shingles(text: str) -> set:
+    """Hashes of the overlapping word n-grams of a text"""
+    words = text.lower().split()
+    if len(words) <= SHINGLE_SIZE:
+        return {hash(tuple(words))}
+    return {hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def drop_near_duplicates(docs: List[Document], threshold: float = 0.8) -> List[Document]:
+    """Drop chunks whose shingle sets are at least ``threshold`` Jaccard-similar to an earlier one"""
+    kept, kept_shingles = [], []
+    for doc in docs:
+        current = shingles(doc.page_content)
+        if any(len(current & other) / len(current | other) >= threshold for other in kept_shingles if current | other):
+            continue
+        kept.append(doc)
+        kept_shingles.append(current)
+    return kept
+
+
+def rerank(docs: List[Document], query: str, idf: Optional[Dict[str, float]] = None) -> List[Document]:
+    """Order chunks by query-term overlap, weighted by IDF and damped by chunk length.
+
+    Ties keep the retrieval order.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return docs
+    idf = idf or {}
+
+    def score(doc: Document) -> float:
+        counts = Counter(tokenize(doc.page_content))
+        matched = sum(idf.get(term, 1.0) * (1 + math.log(counts[term])) for term in terms if counts[term])
+        return matched / math.sqrt(1 + sum(counts.values()) / 100)
+
+    scored = [(score(doc), -rank, doc) for rank, doc in enumerate(docs)]
+    return [doc for _, _, doc in sorted(scored, key=lambda item: (item[0], item[1]), reverse=True)]
+
+
+def apply_token_budget(docs: List[Document], budget: int) -> List[Document]:
+    """Keep chunks in order until the budget is used, cutting the last one at a line or sentence end"""
+    kept, used = [], 0
+    for doc in docs:
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens <= budget:
+            kept.append(doc)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_TAIL_TOKENS:
+            text = doc.page_content[:remaining * CHARS_PER_TOKEN]
+            cut = max(text.rfind("\n"), text.rfind(". "))
+            text = text[:cut + 1] if cut > 0 else text
+            kept.append(Document(page_content=text, metadata={**doc.metadata, "truncated": True}))
+        break
+    return kept
+
+
+def compress_context(docs: List[Document], query: str, token_budget: int,
+                     idf: Optional[Dict[str, float]] = None, duplicate_threshold: float = 0.8) -> List[Document]:
+    """Merge neighbouring chunks, drop near-duplicates, re-rank and fit the result into ``token_budget``"""
+    before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    compressed = merge_neighbors(docs)
+    compressed = drop_near_duplicates(compressed, duplicate_threshold)
+    compressed = rerank(compressed, query, idf)
+    compressed = apply_token_budget(compressed, token_budget)
+    report = {
+        "chunks": len(docs),
+        "kept": len(compressed),
+        "tokens_before": before,
+        "tokens_after": sum(estimate_tokens(doc.page_content) for doc in compressed),
+    }
+    print(f"Context compression: {report}")
+    return compressed
+
+
+class ContextCompressor(BaseDocumentCompressor):
+    """Post-retrieval stage for ContextualCompressionRetriever running compress_context.
+
+    ``lexical_index`` supplies IDF weights for the re-ranker when set.
+    """
+
+    token_budget: int = 1200
+    duplicate_threshold: float = 0.8
+    lexical_index: Any = None
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        idf = self.lexical_index.idf if self.lexical_index is not None else None
+        return compress_context(list(documents), query, self.token_budget, idf, self.duplicate_threshold)
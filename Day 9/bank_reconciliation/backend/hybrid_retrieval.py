@@ -0,0 +1,279 @@
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from knowledge_base import knowledge_files, load_chunks
+
+# BM25 parameters (the usual Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal-rank fusion constant: score = sum(1 / (RRF_K + rank))
+RRF_K = 60
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or should that the this to "
+    "was what when where which who why will with do does can my our we you".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords, shared by indexing and querying"""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+class BM25Index:
+    """Inverted BM25 index over knowledge base chunks, built once and saved as JSON.
+
+    Postings hold term frequencies per chunk and IDF values are precomputed,
+    so a query only touches the postings of its own terms and needs no
+    embedding call.
+    """
+
+    def __init__(self, chunks: List[Dict], postings: Dict[str, List[List[int]]], idf: Dict[str, float],
+                 doc_lengths: List[int], files: Dict[str, str]):
+        self.chunks = chunks
+        self.postings = postings
+        self.idf = idf
+        self.doc_lengths = doc_lengths
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        # sha256 of each source file the index was built from
+        self.files = files
+
+    @classmethod
+    def build(cls, chunks: List[Dict], files: Dict[str, str]) -> "BM25Index":
+        postings = defaultdict(list)
+        doc_lengths = []
+        for doc, chunk in enumerate(chunks):
+            tokens = tokenize(chunk["text"])
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append([doc, tf])
+        n = len(chunks)
+        idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+        return cls(chunks, dict(postings), idf, doc_lengths, files)
+
+    @classmethod
+    def load_or_build(cls, path: str, knowledge_base_dir: str) -> "BM25Index":
+        """The saved index, rebuilt (and saved again) when the source files changed"""
+        files = {source: file_hash for source, (_, file_hash) in knowledge_files(knowledge_base_dir).items()}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except ValueError:
+                # Left truncated by a writer from before saves were atomic: rebuild it
+                data = {}
+            if data.get("files") == files:
+                return cls(data["chunks"], data["postings"], data["idf"], data["doc_lengths"], data["files"])
+        index = cls.build(load_chunks(knowledge_base_dir), files)
+        index.save(path)
+        return index
+
+    def save(self, path: str):
+        """Write the index atomically: a crash or a concurrent build never leaves a partial file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "files": self.files,
+            "chunks": self.chunks,
+            "postings": self.postings,
+            "idf": self.idf,
+            "doc_lengths": self.doc_lengths,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        """Top-k chunks by BM25 score, best first"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / self.avg_length)
+                scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            Document(
+                page_content=self.chunks[doc]["text"],
+                metadata={**self.chunks[doc]["metadata"], "bm25_score": round(score, 4)},
+                id=self.chunks[doc]["id"]
+            )
+            for doc, score in ranked
+        ]
+
+
+def chunk_key(doc: Document) -> str:
+    """Identity of a chunk across the lexical and vector results"""
+    metadata = doc.metadata or {}
+    if "source" in metadata and "chunk_hash" in metadata:
+        return f"{metadata['source']}:{metadata['chunk_hash']}"
+    return doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """Merge ranked lists: each chunk scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores, docs = defaultdict(float), {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = chunk_key(doc)
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class RetrievalStats:
+    """Rolling per-path retrieval latencies (lexical, vector, hybrid) and vector fallbacks"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self.vector_failures = 0
+        self.vector_timeouts = 0
+        self.lexical_only = 0
+
+    def record(self, path: str, seconds: float):
+        with self._lock:
+            self._latencies[path].append(seconds)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            paths = {}
+            for path, samples in self._latencies.items():
+                ordered = sorted(samples)
+                paths[path] = {
+                    "count": len(ordered),
+                    "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+                    "max_ms": round(ordered[-1] * 1000, 2),
+                }
+            return {
+                "latency": paths,
+                "vector_failures": self.vector_failures,
+                "vector_timeouts": self.vector_timeouts,
+                "lexical_only": self.lexical_only,
+            }
+
+
+# Vector searches run here so a slow embedding call can be abandoned after the timeout
+_vector_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector-search")
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 and Chroma similarity fused by reciprocal rank.
+
+    The vector search runs in the background while BM25 scores the query. If
+    it fails or takes longer than ``vector_timeout`` seconds the lexical
+    results are returned on their own, and the vector path is skipped for
+    ``vector_cooldown`` seconds so later questions don't wait on it too.
+    """
+
+    lexical_index: Any
+    vector_store: Any
+    k: int = 4
+    # Candidates taken from each path before fusion
+    fetch_k: int = 8
+    vector_timeout: float = 3.0
+    vector_cooldown: float = 30.0
+    stats: Any = None
+    vector_disabled_until: float = 0.0
+
+    def _vector_search(self, query: str) -> List[Document]:
+        start = time.perf_counter()
+        docs = self.vector_store.similarity_search(query, k=self.fetch_k)
+        self.stats.record("vector", time.perf_counter() - start)
+        return docs
+
+    def _vector_search_batch(self, queries: List[str]) -> List[List[Document]]:
+        """One embedding request for all queries, then a local Chroma lookup per vector.
+
+        The queries are embedded as queries (not documents), the same way
+        similarity_search embeds a single question.
+        """
+        start = time.perf_counter()
+        vectors = self.vector_store.embeddings.embed_documents(queries, task_type="RETRIEVAL_QUERY")
+        self.stats.record("batch_embed", time.perf_counter() - start)
+        return [self.vector_store.similarity_search_by_vector(vector, k=self.fetch_k) for vector in vectors]
+
+    def retrieve_batch(self, queries: List[str]) -> List[List[Document]]:
+        """Hybrid results for several queries, sharing one embedding call and falling back to BM25 alike"""
+        start = time.perf_counter()
+        future = None
+        if self.vector_store is not None and time.monotonic() >= self.vector_disabled_until:
+            future = _vector_pool.submit(self._vector_search_batch, queries)
+        lexical = [self.lexical_index.search(query, self.fetch_k) for query in queries]
+
+        vector = None
+        if future is not None:
+            try:
+                # Embedding many queries takes longer than one, so allow for it
+                vector = future.result(timeout=self.vector_timeout * 2)
+            except FutureTimeoutError:
+                self.stats.vector_timeouts += 1
+                self.vector_disabled_until = time.monotonic() + self.vector_cooldown
+                print(f"Batch vector search exceeded {self.vector_timeout * 2}s, answering from the BM25 index")
+            except Exception as e:
+                self.stats.vector_failures += 1
+                self.vector_disabled_until = time.monotonic() + self.vector_cooldown
+                print(f"Batch vector search failed, answering from the BM25 index: {e}")
+
+        if vector is None:
+            self.stats.lexical_only += len(queries)
+            results = [docs[:self.k] for docs in lexical]
+        else:
+            results = [reciprocal_rank_fusion([lex, vec])[:self.k] for lex, vec in zip(lexical, vector)]
+        self.stats.record("batch", time.perf_counter() - start)
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Optional[CallbackManagerForRetrieverRun] = None) -> List[Document]:
+        start = time.perf_counter()
+        future = None
+        if self.vector_store is not None and time.monotonic() >= self.vector_disabled_until:
+            future = _vector_pool.submit(self._vector_search, query)
+
+        lexical_start = time.perf_counter()
+        lexical = self.lexical_index.search(query, self.fetch_k)
+        self.stats.record("lexical", time.perf_counter() - lexical_start)
+
+        vector = None
+        if future is not None:
+            try:
+                vector = future.result(timeout=self.vector_timeout)
+            except FutureTimeoutError:
+                self.stats.vector_timeouts += 1
+                self.vector_disabled_until = time.monotonic() + self.vector_cooldown
+                print(f"Vector search exceeded {self.vector_timeout}s, answering from the BM25 index")
+            except Exception as e:
+                self.stats.vector_failures += 1
+                self.vector_disabled_until = time.monotonic() + self.vector_cooldown
+                print(f"Vector search failed, answering from the BM25 index: {e}")
+
+        if vector is None:
+            self.stats.lexical_only += 1
+            docs = lexical[:self.k]
+        else:
+            docs = reciprocal_rank_fusion([lexical, vector])[:self.k]
+        self.stats.record("hybrid" if vector is not None else "lexical_only", time.perf_counter() - start)
+        return docs
@@ -0,0 +1,81 @@
+import csv
+import io
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# Parse CSVs in blocks of this many bytes so large statements never need the
+# whole text buffered alongside the parsed columns
+CSV_BLOCK_SIZE = 4 * 1024 * 1024
+
+_STRING_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+TRANSACTION_SCHEMA = {
+    "date": pa.timestamp("s"),
+    "amount": pa.float64(),
+    "description": _STRING_CATEGORY,
+    "transaction_id": _STRING_CATEGORY,
+}
+
+# Columns every upload must have; the discrepancy report reads all of them
+REQUIRED_COLUMNS = ("date", "description", "amount", "transaction_id")
+
+# Both parsers' dates end up in this unit, so frames parsed either way can be joined on date
+DATE_DTYPE = "datetime64[ns]"
+
+# Internal column that is never shown to the LLM or returned to clients
+INTERNAL_COLUMNS = ["amount_cents"]
+
+
+def read_transactions(source: Union[bytes, str]) -> pd.DataFrame:
+    """Read a bank or books CSV from raw bytes or a path with an explicit schema.
+
+    ``date`` is parsed as datetime, ``description`` and ``transaction_id`` as
+    categoricals, and ``amount`` is kept as currency alongside an exact int64
+    ``amount_cents`` column used by the matchers. The pyarrow reader streams
+    the input in blocks; inputs it cannot parse with the strict schema (for
+    example non-ISO dates) fall back to pandas with the same conversions, and
+    dates from either path are returned as DATE_DTYPE.
+    """
+    try:
+        stream = pa.BufferReader(source) if isinstance(source, bytes) else source
+        reader = pa_csv.open_csv(
+            stream,
+            read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(column_types=TRANSACTION_SCHEMA, strings_can_be_null=True),
+        )
+        table = pa.Table.from_batches(list(reader), schema=reader.schema).unify_dictionaries()
+        df = table.to_pandas()
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        print(f"Falling back to pandas CSV parsing: {e}")
+        df = pd.read_csv(io.BytesIO(source) if isinstance(source, bytes) else source)
+        if "date" in df:
+            df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        if "amount" in df:
+            df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+        for column in ("description", "transaction_id"):
+            if column in df:
+                df[column] = df[column].astype("category")
+
+    if "date" in df:
+        df["date"] = df["date"].astype(DATE_DTYPE)
+    if "amount" in df:
+        cents = pd.Series(np.rint(df["amount"].to_numpy(dtype="float64") * 100), index=df.index)
+        # Missing amounts need the nullable integer type; everything else stays plain int64
+        df["amount_cents"] = cents.astype("Int64" if cents.isna().any() else "int64")
+    return df
+
+
+def missing_columns(content: bytes) -> List[str]:
+    """Required columns absent from a CSV upload's header line, checked without parsing the rows"""
+    header = content.split(b"\n", 1)[0].decode("utf-8-sig", errors="replace")
+    columns = {column.strip() for column in next(csv.reader([header]), [])}
+    return [column for column in REQUIRED_COLUMNS if column not in columns]
+
+
+def public_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """The frame without internal helper columns, for prompts and responses"""
+    return df.drop(columns=INTERNAL_COLUMNS, errors="ignore")
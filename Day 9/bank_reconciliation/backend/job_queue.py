@@ -0,0 +1,216 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+# Stages reported by a job, in the order they run
+JOB_STAGES = ("match", "detect", "suggest")
+
+
+class JobStore:
+    """SQLite table of reconciliation jobs: parameters, uploads, per-stage progress and results.
+
+    Uploads are kept until the job finishes, so queued or interrupted jobs can
+    be picked up again after a restart. A worker claims a job atomically and
+    owns it while it keeps the job's heartbeat fresh, so several API processes
+    can share one store without running a job twice.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, mode TEXT NOT NULL, tolerance_days INTEGER NOT NULL, "
+                "stages TEXT NOT NULL, bank_content BLOB, books_content BLOB, result TEXT, error TEXT, "
+                "created REAL NOT NULL, updated REAL NOT NULL, owner TEXT, heartbeat REAL)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, bank_content: bytes, books_content: bytes, mode: str, tolerance_days: int) -> str:
+        job_id = uuid.uuid4().hex
+        stages = {stage: {"status": "pending"} for stage in JOB_STAGES}
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, mode, tolerance_days, stages, bank_content, books_content, created, updated) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, mode, tolerance_days, json.dumps(stages), bank_content, books_content, now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Status, per-stage progress and (once completed) the result of a job"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, mode, tolerance_days, stages, result, error, created, updated FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row[0],
+            "status": row[1],
+            "mode": row[2],
+            "tolerance_days": row[3],
+            "stages": json.loads(row[4]),
+            "created": row[7],
+            "updated": row[8],
+        }
+        if row[5] is not None:
+            job["result"] = json.loads(row[5])
+        if row[6] is not None:
+            job["error"] = row[6]
+        return job
+
+    def inputs(self, job_id: str) -> tuple:
+        """(bank_content, books_content, mode, tolerance_days) of a job"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT bank_content, books_content, mode, tolerance_days FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Mark a queued job as running for ``owner``; False if another worker got it first"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat = ?, updated = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (owner, now, now, job_id)
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, owner: str):
+        """Renew the lease on every job ``owner`` is running"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = 'running'", (time.time(), owner)
+            )
+
+    def requeue_expired(self, lease_seconds: float) -> List[str]:
+        """Put running jobs whose owner stopped heartbeating back in the queue; returns their ids"""
+        cutoff = time.time() - lease_seconds
+        requeued = []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'running' AND (heartbeat IS NULL OR heartbeat < ?) "
+                "ORDER BY created",
+                (cutoff,)
+            ).fetchall()
+            for (job_id,) in rows:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ? AND status = 'running' "
+                    "AND (heartbeat IS NULL OR heartbeat < ?)",
+                    (job_id, cutoff)
+                )
+                if cursor.rowcount == 1:
+                    requeued.append(job_id)
+        return requeued
+
+    def update_stage(self, job_id: str, owner: str, stage: str, **progress):
+        with self._connect() as conn:
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            stages = json.loads(row[0])
+            stages[stage] = progress
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET stages = ?, heartbeat = ?, updated = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (json.dumps(stages), now, now, job_id, owner)
+            )
+
+    def finish(self, job_id: str, owner: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """Store the outcome and drop the uploads, unless the job has been handed to another worker"""
+        status = "failed" if error is not None else "completed"
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, bank_content = NULL, books_content = NULL, "
+                "updated = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, json.dumps(result, default=str) if result is not None else None, error, time.time(),
+                 job_id, owner)
+            )
+
+    def queued(self) -> List[str]:
+        """Ids of jobs waiting for a worker, oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created").fetchall()
+        return [row[0] for row in rows]
+
+
+class JobQueue:
+    """Fixed pool of worker threads running reconciliation jobs from a JobStore.
+
+    ``run_job(job_id, bank_content, books_content, mode, tolerance_days,
+    progress)`` does the work and returns the result; it reports stage progress
+    by calling ``progress(stage, **fields)``. Throughput is bounded by the
+    number of workers, however many clients submit jobs.
+
+    Each queue heartbeats the jobs it runs every ``lease_seconds / 3``; a
+    running job whose heartbeat is older than ``lease_seconds`` belongs to a
+    dead process and is requeued by whichever queue notices first.
+    """
+
+    def __init__(self, store: JobStore, run_job: Callable, workers: int = 2, lease_seconds: float = 60):
+        self.store = store
+        self.run_job = run_job
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._queue = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        """Start the workers, requeue jobs whose owner died and pick up queued ones"""
+        self.store.requeue_expired(self.lease_seconds)
+        for job_id in self.store.queued():
+            self._queue.put(job_id)
+        threads = [threading.Thread(target=self._keep_leases, name="reconciliation-job-lease", daemon=True)]
+        for index in range(self.workers):
+            threads.append(threading.Thread(target=self._work, name=f"reconciliation-job-{index}", daemon=True))
+        for thread in threads:
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, bank_content: bytes, books_content: bytes, mode: str, tolerance_days: int) -> str:
+        job_id = self.store.create(bank_content, books_content, mode, tolerance_days)
+        self._queue.put(job_id)
+        return job_id
+
+    def _keep_leases(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                self.store.heartbeat(self.owner)
+                for job_id in self.store.requeue_expired(self.lease_seconds):
+                    print(f"Requeued reconciliation job {job_id} after its worker stopped responding")
+                    self._queue.put(job_id)
+            except Exception as e:
+                print(f"Failed to renew reconciliation job leases: {e}")
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                # Every process sees the queued rows; only the one that claims a job runs it
+                if not self.store.claim(job_id, self.owner):
+                    continue
+                bank_content, books_content, mode, tolerance_days = self.store.inputs(job_id)
+                progress = lambda stage, **fields: self.store.update_stage(job_id, self.owner, stage, **fields)
+                result = self.run_job(job_id, bank_content, books_content, mode, tolerance_days, progress)
+                self.store.finish(job_id, self.owner, result=result)
+            except Exception as e:
+                print(f"Reconciliation job {job_id} failed: {e}")
+                self.store.finish(job_id, self.owner, error=str(e))
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,145 @@
+import json
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional
+
+
+class JSONStreamParser:
+    """Incremental parser for JSON embedded in (streamed) LLM output.
+
+    Text is fed chunk by chunk. Anything before the first ``{`` or ``[`` (prose,
+    markdown fences) is skipped, and each element of the target array is
+    decoded and returned by ``feed`` as soon as it closes. The target array is
+    the root array, or the root object's ``array_key`` member. The scan is a
+    single linear pass: positions are absolute offsets into the whole response,
+    but only the text from the oldest still-open element or string onward is
+    kept for scanning, and the full text is joined once in ``close``. ``close``
+    still returns the elements recovered so far when the tail of the response
+    is truncated or malformed.
+    """
+
+    def __init__(self, array_key: Optional[str] = None):
+        self.array_key = array_key
+        self.elements = []
+        self._chunks = []
+        # Unconsumed text, starting at absolute position self._offset
+        self._buffer = ""
+        self._offset = 0
+        self._pos = 0
+        self._root_start = None
+        self._root_end = None
+        self._root_kind = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_key = None
+        self._array_depth = None
+        self._element_start = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume the next chunk of text and return the elements it completed"""
+        self._chunks.append(chunk)
+        completed = []
+        if self._root_end is not None:
+            return completed
+        # Drop text that no open string or element can still refer to
+        keep = self._pos
+        if self._in_string:
+            keep = min(keep, self._string_start)
+        if self._element_start is not None:
+            keep = min(keep, self._element_start)
+        self._buffer = self._buffer[keep - self._offset:] + chunk
+        self._offset = keep
+        text, offset = self._buffer, self._offset
+        for pos in range(self._pos, offset + len(text)):
+            char = text[pos - offset]
+            if self._root_end is not None:
+                break
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._root_kind == "{" and len(self._stack) == 1:
+                        self._last_key = text[self._string_start + 1 - offset:pos - offset]
+                continue
+
+            if self._root_start is None:
+                if char in "{[":
+                    self._root_start = pos
+                    self._root_kind = char
+                else:
+                    continue
+
+            in_target = self._array_depth is not None and len(self._stack) == self._array_depth
+            if in_target and self._element_start is None and char not in " \t\r\n,]":
+                self._element_start = pos
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "{[":
+                self._stack.append(char)
+                if char == "[" and self._array_depth is None and self._is_target(len(self._stack)):
+                    self._array_depth = len(self._stack)
+            elif char in "}]":
+                if in_target and char == "]":
+                    self._close_element(pos, completed)
+                    self._array_depth = -1
+                if self._stack:
+                    self._stack.pop()
+                if not self._stack:
+                    self._root_end = pos + 1
+            elif char == "," and in_target:
+                self._close_element(pos, completed)
+        self._pos = offset + len(text)
+        return completed
+
+    def _is_target(self, depth: int) -> bool:
+        if self._root_kind == "[":
+            return depth == 1
+        return depth == 2 and (self.array_key is None or self._last_key == self.array_key)
+
+    def _close_element(self, end: int, completed: List[Any]):
+        if self._element_start is None:
+            return
+        raw = self._buffer[self._element_start - self._offset:end - self._offset]
+        self._element_start = None
+        try:
+            element = json.loads(raw)
+        except json.JSONDecodeError as e:
+            print(f"Skipping malformed element in LLM response: {e}")
+            return
+        self.elements.append(element)
+        completed.append(element)
+
+    def close(self) -> Any:
+        """The whole parsed document, or the elements recovered if it did not parse"""
+        text = "".join(self._chunks)
+        if self._root_start is not None and self._root_end is not None:
+            try:
+                return json.loads(text[self._root_start:self._root_end])
+            except json.JSONDecodeError as e:
+                print(f"Error decoding JSON from LLM: {e}")
+        if not self.elements:
+            print(f"No valid JSON object or array found in LLM response: {text[:500]}")
+            return None
+        if self._root_kind == "{" and self.array_key:
+            return {self.array_key: list(self.elements)}
+        return list(self.elements)
+
+
+def parse_json_response(text: str, array_key: Optional[str] = None) -> Any:
+    """Parse the JSON in a complete LLM response, salvaging array elements from a bad tail"""
+    parser = JSONStreamParser(array_key)
+    parser.feed(text)
+    return parser.close()
+
+
+async def aiter_json_array(chunks: AsyncIterable, array_key: Optional[str] = None) -> AsyncIterator[Any]:
+    """Yield the target array's elements from ``llm.astream`` output (text or message chunks) as they close"""
+    parser = JSONStreamParser(array_key)
+    async for chunk in chunks:
+        for element in parser.feed(getattr(chunk, "content", chunk)):
+            yield element
@@ -0,0 +1,120 @@
+import glob
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Chunking used for every knowledge base file
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Records the content hash of each ingested file, next to the Chroma files
+MANIFEST_NAME = "knowledge_manifest.json"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_file(path: str, source: str) -> List[Dict]:
+    """Chunks of one knowledge base file, each with a content-hash id and metadata"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks, seen = [], {}
+    for position, chunk in enumerate(splitter.split_text(text)):
+        chunk_hash = _sha256(chunk)
+        # Identical chunks within a file still need distinct ids
+        seen[chunk_hash] = seen.get(chunk_hash, -1) + 1
+        chunks.append({
+            "id": f"{source}:{chunk_hash[:32]}:{seen[chunk_hash]}",
+            "text": chunk,
+            "metadata": {"source": source, "chunk_hash": chunk_hash, "position": position},
+        })
+    return chunks
+
+
+def knowledge_files(knowledge_base_dir: str) -> Dict[str, tuple]:
+    """{source: (path, sha256 of the file)} for every .txt file under knowledge_base_dir"""
+    files = {}
+    for path in sorted(glob.glob(os.path.join(knowledge_base_dir, "**", "*.txt"), recursive=True)):
+        with open(path, "rb") as f:
+            files[os.path.relpath(path, knowledge_base_dir)] = (path, hashlib.sha256(f.read()).hexdigest())
+    return files
+
+
+def load_chunks(knowledge_base_dir: str) -> List[Dict]:
+    """Chunks of every knowledge base file, split the same way as for the vector store"""
+    return [
+        chunk
+        for source, (path, _) in knowledge_files(knowledge_base_dir).items()
+        for chunk in split_file(path, source)
+    ]
+
+
+def sync_knowledge_base(vector_store, knowledge_base_dir: str, persist_directory: str, batch_size: int = 64) -> Dict:
+    """Bring the vector store in line with the .txt files in knowledge_base_dir.
+
+    Files whose content hash matches the manifest are skipped without being
+    read into chunks. For changed files only chunks with new content are
+    embedded, in batches of ``batch_size``; chunks that no longer exist and
+    files that were removed are deleted from the store.
+    """
+    manifest_path = os.path.join(persist_directory, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    stats = {"files_skipped": 0, "files_updated": 0, "files_removed": 0, "chunks_added": 0, "chunks_removed": 0}
+    files = knowledge_files(knowledge_base_dir)
+    current = {source: file_hash for source, (_, file_hash) in files.items()}
+    for source, (path, file_hash) in files.items():
+        if manifest.get(source) == file_hash:
+            stats["files_skipped"] += 1
+            continue
+
+        chunks = split_file(path, source)
+        stored = vector_store.get(where={"source": source}, include=["metadatas"])
+        existing = dict(zip(stored["ids"], stored["metadatas"]))
+        new_chunks = [chunk for chunk in chunks if chunk["id"] not in existing]
+        # Kept chunks are not re-embedded, but their position may have shifted
+        moved = [chunk for chunk in chunks if chunk["id"] in existing and existing[chunk["id"]] != chunk["metadata"]]
+        if moved:
+            vector_store._collection.update(
+                ids=[chunk["id"] for chunk in moved], metadatas=[chunk["metadata"] for chunk in moved]
+            )
+        for start in range(0, len(new_chunks), batch_size):
+            batch = new_chunks[start:start + batch_size]
+            vector_store.add_texts(
+                [chunk["text"] for chunk in batch],
+                metadatas=[chunk["metadata"] for chunk in batch],
+                ids=[chunk["id"] for chunk in batch]
+            )
+        stale = list(set(existing) - {chunk["id"] for chunk in chunks})
+        if stale:
+            vector_store.delete(ids=stale)
+        stats["files_updated"] += 1
+        stats["chunks_added"] += len(new_chunks)
+        stats["chunks_removed"] += len(stale)
+        # Saved after each file, so an interrupted sync keeps the files it finished
+        manifest[source] = file_hash
+        _write_manifest(manifest_path, manifest)
+
+    for source in [source for source in manifest if source not in current]:
+        removed = vector_store.get(where={"source": source}, include=[])["ids"]
+        if removed:
+            vector_store.delete(ids=removed)
+        stats["files_removed"] += 1
+        stats["chunks_removed"] += len(removed)
+        del manifest[source]
+        _write_manifest(manifest_path, manifest)
+    return stats
+
+
+def _write_manifest(path: str, manifest: Dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration
+from langchain_core.load import dumps, loads
+
+from config import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ITEMS
+
+
+class LLMResponseCache(BaseCache):
+    """Prompt-level response cache shared by the reconciliation agents.
+
+    Plugged into each chat model through LangChain's ``cache`` hook. Entries are
+    keyed on the serialized model configuration (model name, temperature and
+    other invocation parameters) plus the whitespace-normalized prompt, expire
+    after ``ttl_seconds``, and are kept in an in-memory LRU backed by a SQLite
+    file so they survive restarts. Hit and miss counts are available from
+    ``stats()``.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 24 * 3600, max_items: int = 10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        normalized = " ".join(prompt.split())
+        return hashlib.sha256(f"{llm_string}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+        value = None
+        if self.path:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    value = loads(row[0])
+                    self._remember(key, row[1], value)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        expires = now + self.ttl_seconds
+        self._remember(key, expires, return_val)
+        if self.path:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                    (key, dumps(return_val), expires, now)
+                )
+                self._evict(conn, now)
+
+    def _remember(self, key: str, expires: float, value: RETURN_VAL_TYPE):
+        with self._lock:
+            self._memory[key] = (expires, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired rows, then the least recently used ones beyond max_items"""
+        conn.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_items,)
+        )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """The process-wide response cache passed to every agent's chat model"""
+    global _response_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ITEMS)
+        return _response_cache
+
+
+async def astream_with_cache(llm, prompt):
+    """``llm.astream(prompt)`` that also reads and fills the model's response cache.
+
+    LangChain only consults the cache for invoke/generate, so streamed calls
+    would always reach the model. This uses the same cache key as ``ainvoke``:
+    a hit is replayed as a single chunk, and a miss is streamed through and
+    its full text stored once the stream completes.
+    """
+    cache = getattr(llm, "cache", None)
+    if not isinstance(llm, BaseChatModel) or not isinstance(cache, BaseCache):
+        async for chunk in llm.astream(prompt):
+            yield chunk
+        return
+
+    messages = llm._convert_input(prompt).to_messages()
+    key_prompt = dumps(messages)
+    llm_string = llm._get_llm_string()
+    cached = await cache.alookup(key_prompt, llm_string)
+    if isinstance(cached, list) and cached:
+        yield AIMessageChunk(content=cached[0].message.content)
+        return
+
+    parts = []
+    async for chunk in llm.astream(messages):
+        parts.append(chunk.content if isinstance(chunk.content, str) else "")
+        yield chunk
+    await cache.aupdate(key_prompt, llm_string, [ChatGeneration(message=AIMessage(content="".join(parts)))])
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import weakref
+
+from config import GOOGLE_API_KEY
+from llm_cache import get_response_cache
+
+# One chat model per event loop (and one for synchronous calls): the Gemini
+# client creates its async gRPC channel on first use and binds it to that loop
+_sync_chat_model = None
+_loop_chat_models = weakref.WeakKeyDictionary()
+_chat_model_lock = threading.Lock()
+
+
+def _build_chat_model():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-1.5-flash",
+        google_api_key=GOOGLE_API_KEY,
+        temperature=0.7,
+        convert_system_message_to_human=True,
+        cache=get_response_cache()
+    )
+
+
+def get_chat_model():
+    """The Gemini chat model shared by every agent on the current event loop.
+
+    Built on first use, so importing the API needs neither the Google client
+    libraries nor credentials. All agents send plain prompts with the same
+    settings, so one client serves them all; each event loop gets its own
+    instance because the async channel cannot be used from another loop. The
+    LLM response cache is the same process-wide cache for every instance.
+    """
+    global _sync_chat_model
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _chat_model_lock:
+        if loop is None:
+            if _sync_chat_model is None:
+                _sync_chat_model = _build_chat_model()
+            return _sync_chat_model
+        if loop not in _loop_chat_models:
+            _loop_chat_models[loop] = _build_chat_model()
+        return _loop_chat_models[loop]
@@ -0,0 +1,477 @@
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process, utils
+from scipy import sparse
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from typing import Callable, List, Dict, Tuple
+
+DESCRIPTION_MIN_SCORE = 80
+DATE_WINDOW_DAYS = 5
+BLOCK_CHUNK_SIZE = 1024
+# Most book rows compared against one bank chunk in a single cdist call
+BLOCK_MAX_BOOK_ROWS = 4096
+CANDIDATES_PER_ROW = 5
+# Candidate pairs may differ in amount by at most this fraction of the larger one
+AMOUNT_TOLERANCE = 0.1
+# Upper bound on tolerance-join passes; each pass re-pairs rows that lost a conflict
+TOLERANCE_MAX_PASSES = 16
+ASSIGNMENT_MIN_SCORE = 60
+ASSIGNMENT_WEIGHTS = {"amount": 0.5, "date": 0.2, "description": 0.3}
+SPLIT_MAX_CANDIDATES = 16
+SPLIT_MAX_GROUP_SIZE = 4
+
+
+def to_cents(amounts: pd.Series) -> pd.Series:
+    """Convert a column of currency amounts to int64 cents"""
+    values = pd.to_numeric(amounts, errors="coerce").to_numpy(dtype="float64")
+    return pd.Series(np.rint(values * 100), index=amounts.index).astype("Int64")
+
+
+def _cents(df: pd.DataFrame) -> pd.Series:
+    """Amounts in cents, using the column parsed at ingestion when present"""
+    if "amount_cents" in df:
+        return df["amount_cents"].astype("Int64")
+    return to_cents(df["amount"])
+
+
+def _match_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Build the (amount_cents, date) join keys for a transactions frame"""
+    keys = pd.DataFrame(index=df.index)
+    keys["amount_cents"] = _cents(df)
+    keys["date"] = pd.to_datetime(df["date"], errors="coerce").dt.normalize()
+    keys = keys.dropna()
+    keys["amount_cents"] = keys["amount_cents"].astype("int64")
+    # Rank duplicates inside each key so repeated (amount, date) pairs are
+    # paired off one-to-one in order of appearance instead of cross-joined.
+    keys["occurrence"] = keys.groupby(["amount_cents", "date"]).cumcount()
+    return keys
+
+
+def _column(rows: pd.DataFrame, name: str) -> np.ndarray:
+    """Return a column as an array, or an all-None array if it is absent"""
+    if name in rows:
+        return rows[name].to_numpy()
+    return np.full(len(rows), None, dtype=object)
+
+
+def _build_match_records(bank_df: pd.DataFrame, books_df: pd.DataFrame, bank_index, book_index,
+                         score, match_type: str) -> List[Dict]:
+    """Build match dicts in the same shape the API returns for LLM matches"""
+    bank_rows = bank_df.loc[bank_index]
+    book_rows = books_df.loc[book_index]
+    records = pd.DataFrame({
+        "bank_index": np.asarray(bank_index),
+        "book_index": np.asarray(book_index),
+        "bank_transaction_id": _column(bank_rows, "transaction_id"),
+        "book_transaction_id": _column(book_rows, "transaction_id"),
+        "description_match": _column(bank_rows, "description"),
+        "book_description": _column(book_rows, "description"),
+        "bank_amount": pd.to_numeric(bank_rows["amount"], errors="coerce").to_numpy(),
+        "book_amount": pd.to_numeric(book_rows["amount"], errors="coerce").to_numpy(),
+    })
+    records["amount_match"] = np.isclose(records["bank_amount"], records["book_amount"])
+    records["score"] = np.round(np.broadcast_to(score, len(records)).astype(float), 2)
+    records["confidence"] = np.round(records["score"] / 100, 4)
+    records["match_type"] = match_type
+    return records.astype(object).where(records.notna(), None).to_dict("records")
+
+
+def exact_match(bank_df: pd.DataFrame, books_df: pd.DataFrame) -> Tuple[List[Dict], pd.Index, pd.Index]:
+    """Hash-join bank and book rows on (amount in cents, date).
+
+    Returns the exact matches plus the index labels of the bank and book rows
+    that were left over for the slower matching stages.
+    """
+    if not {"amount", "date"} <= set(bank_df.columns) & set(books_df.columns):
+        return [], bank_df.index, books_df.index
+    bank_keys = _match_keys(bank_df)
+    book_keys = _match_keys(books_df)
+    joined = bank_keys.reset_index(names="bank_index").merge(
+        book_keys.reset_index(names="book_index"),
+        on=["amount_cents", "date", "occurrence"],
+        how="inner",
+    )
+    matches = _build_match_records(
+        bank_df, books_df, joined["bank_index"], joined["book_index"], 100, "exact"
+    )
+    unmatched_bank = bank_df.index.difference(pd.Index(joined["bank_index"]), sort=False)
+    unmatched_books = books_df.index.difference(pd.Index(joined["book_index"]), sort=False)
+    return matches, unmatched_bank, unmatched_books
+
+
+def _amount_bucket(cents: np.ndarray) -> np.ndarray:
+    """Signed geometric amount bucket used to block candidate pairs.
+
+    Each bucket spans a factor of 1 / (1 - AMOUNT_TOLERANCE), so amounts within
+    the tolerance of each other always fall in the same or an adjacent bucket.
+    """
+    width = -np.log1p(-AMOUNT_TOLERANCE)
+    bucket = np.floor(np.log(np.maximum(np.abs(cents), 1)) / width).astype("int64")
+    return np.where(cents < 0, -(bucket + 1), bucket + 1)
+
+
+def _block_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Columns needed for blocking, with unusable rows dropped and sorted by date"""
+    block = pd.DataFrame(index=df.index)
+    block["amount_cents"] = _cents(df)
+    block["day"] = pd.to_datetime(df["date"], errors="coerce").dt.normalize()
+    block["description"] = df["description"].astype("string")
+    block = block.dropna()
+    block["amount_cents"] = block["amount_cents"].astype("int64")
+    block["day"] = (block["day"] - pd.Timestamp("1970-01-01")) // pd.Timedelta(days=1)
+    block["bucket"] = _amount_bucket(block["amount_cents"].to_numpy())
+    return block.sort_values("day", kind="stable")
+
+
+def _candidate_pairs(bank_df: pd.DataFrame, books_df: pd.DataFrame, date_window_days: int,
+                     pair_score: Callable, score_cutoff: float = 0) -> pd.DataFrame:
+    """Generate scored candidate pairs within amount-bucket and date-window blocks.
+
+    Bank rows are compared only against book rows of the same sign whose
+    amount is within AMOUNT_TOLERANCE and whose date is within
+    ``date_window_days``. Description similarities for each block are computed
+    in bulk with ``rapidfuzz.process.cdist`` and passed to ``pair_score``, which
+    returns the final score matrix; only the best few pairs per bank row are kept.
+    Bank chunks span at most ``date_window_days`` and are cut short so each is
+    compared against at most BLOCK_MAX_BOOK_ROWS book rows (unless a single
+    bank row's window has more).
+    """
+    bank_block = _block_frame(bank_df)
+    book_block = _block_frame(books_df)
+
+    pair_bank, pair_book, pair_score_values = [], [], []
+    for bucket, bank_group in bank_block.groupby("bucket", sort=False):
+        book_group = book_block[book_block["bucket"].isin([bucket - 1, bucket, bucket + 1])]
+        if book_group.empty:
+            continue
+        book_days = book_group["day"].to_numpy()
+        # Book rows in each bank row's date window; both bounds grow with the bank date
+        group_days = bank_group["day"].to_numpy()
+        window_lo = np.searchsorted(book_days, group_days - date_window_days, side="left")
+        window_hi = np.searchsorted(book_days, group_days + date_window_days, side="right")
+        start = 0
+        while start < len(bank_group):
+            # A chunk spans at most date_window_days of bank dates, so its book rows
+            # are not much more than each bank row's own window
+            end = min(
+                start + BLOCK_CHUNK_SIZE,
+                np.searchsorted(group_days, group_days[start] + date_window_days, side="right"),
+                np.searchsorted(window_hi, window_lo[start] + BLOCK_MAX_BOOK_ROWS, side="right"),
+            )
+            end = max(end, start + 1)
+            bank_chunk = bank_group.iloc[start:end]
+            bank_days = group_days[start:end]
+            lo, hi = window_lo[start], window_hi[end - 1]
+            start = end
+            if lo == hi:
+                continue
+            book_chunk = book_group.iloc[lo:hi]
+            similarity = process.cdist(
+                bank_chunk["description"].tolist(),
+                book_chunk["description"].tolist(),
+                scorer=fuzz.WRatio,
+                processor=utils.default_process,
+                score_cutoff=score_cutoff,
+                dtype=np.uint8,
+                workers=-1,
+            )
+            scores = np.asarray(pair_score(bank_chunk, book_chunk, similarity), dtype="float64")
+            day_delta = np.abs(bank_days[:, None] - book_days[None, lo:hi])
+            bank_cents = bank_chunk["amount_cents"].to_numpy()[:, None]
+            book_cents = book_chunk["amount_cents"].to_numpy()[None, :]
+            amount_delta = np.abs(bank_cents - book_cents)
+            amount_out = amount_delta > AMOUNT_TOLERANCE * np.maximum(np.abs(bank_cents), np.abs(book_cents))
+            scores[(day_delta > date_window_days) | (similarity < score_cutoff) | amount_out] = 0
+            # Keep only the best few candidates per bank row so dense blocks stay linear
+            if scores.shape[1] > CANDIDATES_PER_ROW:
+                top = np.argpartition(scores, -CANDIDATES_PER_ROW, axis=1)[:, -CANDIDATES_PER_ROW:]
+                keep = np.zeros_like(scores, dtype=bool)
+                np.put_along_axis(keep, top, True, axis=1)
+                scores[~keep] = 0
+            rows, cols = np.nonzero(scores)
+            pair_bank.append(bank_chunk.index.to_numpy()[rows])
+            pair_book.append(book_chunk.index.to_numpy()[cols])
+            pair_score_values.append(scores[rows, cols])
+
+    if not pair_bank:
+        return pd.DataFrame({"bank_index": [], "book_index": [], "score": []})
+    return pd.DataFrame({
+        "bank_index": np.concatenate(pair_bank),
+        "book_index": np.concatenate(pair_book),
+        "score": np.concatenate(pair_score_values),
+    })
+
+
+def description_match(bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                      min_score: float = DESCRIPTION_MIN_SCORE,
+                      date_window_days: int = DATE_WINDOW_DAYS) -> Tuple[List[Dict], pd.Index, pd.Index]:
+    """Match rows by description similarity within amount-bucket and date-window blocks.
+
+    Candidate pairs come from ``_candidate_pairs`` scored on description
+    similarity alone and are then taken best-first, one-to-one.
+    """
+    if not {"amount", "date", "description"} <= set(bank_df.columns) & set(books_df.columns):
+        return [], bank_df.index, books_df.index
+    candidates = _candidate_pairs(
+        bank_df, books_df, date_window_days,
+        lambda bank_chunk, book_chunk, similarity: similarity,
+        score_cutoff=min_score,
+    )
+    if candidates.empty:
+        return [], bank_df.index, books_df.index
+    candidates = candidates.sort_values("score", ascending=False, kind="stable")
+
+    # Greedy best-first one-to-one selection
+    used_bank, used_book, selected = set(), set(), []
+    for bank_index, book_index, score in candidates.itertuples(index=False):
+        if bank_index in used_bank or book_index in used_book:
+            continue
+        used_bank.add(bank_index)
+        used_book.add(book_index)
+        selected.append((bank_index, book_index, score))
+
+    bank_index, book_index, score = (list(column) for column in zip(*selected))
+    matches = _build_match_records(bank_df, books_df, bank_index, book_index, np.array(score), "description")
+    unmatched_bank = bank_df.index.difference(pd.Index(bank_index), sort=False)
+    unmatched_books = books_df.index.difference(pd.Index(book_index), sort=False)
+    return matches, unmatched_bank, unmatched_books
+
+
+def _feature_score(date_window_days: int) -> Callable:
+    """Combined pair score from amount delta, day delta and description similarity"""
+    def score(bank_chunk: pd.DataFrame, book_chunk: pd.DataFrame, similarity: np.ndarray) -> np.ndarray:
+        bank_cents = bank_chunk["amount_cents"].to_numpy()[:, None]
+        book_cents = book_chunk["amount_cents"].to_numpy()[None, :]
+        amount_delta = np.abs(bank_cents - book_cents)
+        amount_scale = np.maximum(np.maximum(np.abs(bank_cents), np.abs(book_cents)), 1)
+        amount_score = 100 * (1 - np.minimum(amount_delta / amount_scale, 1))
+        day_delta = np.abs(bank_chunk["day"].to_numpy()[:, None] - book_chunk["day"].to_numpy()[None, :])
+        day_score = 100 * (1 - np.minimum(day_delta / (date_window_days + 1), 1))
+        return (
+            ASSIGNMENT_WEIGHTS["amount"] * amount_score
+            + ASSIGNMENT_WEIGHTS["date"] * day_score
+            + ASSIGNMENT_WEIGHTS["description"] * similarity
+        )
+    return score
+
+
+def assignment_match(bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                     min_score: float = ASSIGNMENT_MIN_SCORE,
+                     date_window_days: int = DATE_WINDOW_DAYS) -> Tuple[List[Dict], pd.Index, pd.Index]:
+    """Globally optimal one-to-one matching of bank to book rows.
+
+    Candidate pairs are scored on amount delta, day delta and description
+    similarity, then matched by a sparse minimum-cost bipartite assignment
+    (``scipy.sparse.csgraph.min_weight_full_bipartite_matching``). Every row
+    also gets a dummy partner at the cost of leaving it unmatched, so rows
+    without a good candidate stay unmatched instead of being forced into a pair.
+    """
+    if not {"amount", "date", "description"} <= set(bank_df.columns) & set(books_df.columns):
+        return [], bank_df.index, books_df.index
+    candidates = _candidate_pairs(bank_df, books_df, date_window_days, _feature_score(date_window_days))
+    candidates = candidates[candidates["score"] >= min_score]
+    if candidates.empty:
+        return [], bank_df.index, books_df.index
+
+    bank_labels = pd.Index(candidates["bank_index"].unique())
+    book_labels = pd.Index(candidates["book_index"].unique())
+    n_bank, n_book = len(bank_labels), len(book_labels)
+    rows = bank_labels.get_indexer(candidates["bank_index"])
+    cols = book_labels.get_indexer(candidates["book_index"])
+    # Costs must be non-zero for the sparse solver, so every edge is offset by one.
+    # Rows [0, n_bank) are bank rows, rows [n_bank, n_bank + n_book) are dummies for
+    # book rows; columns mirror that. Taking a real pair (i, j) frees both dummies,
+    # which then pair with each other through the transposed (j', i') edge.
+    unmatched_cost = 100 - min_score + 1
+    real_cost = 100 - candidates["score"].to_numpy() + 1
+    bank_dummy = np.arange(n_bank)
+    book_dummy = np.arange(n_book)
+    graph = sparse.coo_matrix(
+        (
+            np.concatenate([real_cost, np.full(n_bank, unmatched_cost), np.full(n_book, unmatched_cost), np.ones(len(rows))]),
+            (
+                np.concatenate([rows, bank_dummy, n_bank + book_dummy, n_bank + cols]),
+                np.concatenate([cols, n_book + bank_dummy, book_dummy, n_book + rows]),
+            ),
+        ),
+        shape=(n_bank + n_book, n_book + n_bank),
+    ).tocsr()
+    assigned_rows, assigned_cols = min_weight_full_bipartite_matching(graph)
+    real = (assigned_rows < n_bank) & (assigned_cols < n_book)
+    pairs = pd.DataFrame({
+        "bank_index": bank_labels[assigned_rows[real]],
+        "book_index": book_labels[assigned_cols[real]],
+    }).merge(candidates, on=["bank_index", "book_index"], how="left")
+    pairs = pairs.iloc[np.argsort(bank_df.index.get_indexer(pairs["bank_index"]), kind="stable")]
+
+    matches = _build_match_records(
+        bank_df, books_df, pairs["bank_index"], pairs["book_index"], pairs["score"].to_numpy(), "assignment"
+    )
+    unmatched_bank = bank_df.index.difference(pd.Index(pairs["bank_index"]), sort=False)
+    unmatched_books = books_df.index.difference(pd.Index(pairs["book_index"]), sort=False)
+    return matches, unmatched_bank, unmatched_books
+
+
+def tolerance_match(bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                    tolerance_days: int = DATE_WINDOW_DAYS) -> Tuple[List[Dict], pd.Index, pd.Index]:
+    """Match rows with equal amounts whose dates differ by at most ``tolerance_days``.
+
+    Each pass runs a sort-merge ``pandas.merge_asof`` on date, grouped by
+    amount only, giving every bank row its nearest-dated book row within the
+    tolerance. Book rows claimed by several bank rows go to the closest one
+    (smallest day delta first), the paired rows are removed, and the losers
+    try again against what is left until a pass finds nothing new.
+    """
+    if not {"amount", "date"} <= set(bank_df.columns) & set(books_df.columns):
+        return [], bank_df.index, books_df.index
+    bank_keys = _match_keys(bank_df)[["amount_cents", "date"]]
+    book_keys = _match_keys(books_df)[["amount_cents", "date"]]
+    tolerance = pd.Timedelta(days=tolerance_days)
+
+    matched = []
+    for _ in range(TOLERANCE_MAX_PASSES):
+        if bank_keys.empty or book_keys.empty:
+            break
+        left = bank_keys.sort_values("date", kind="stable").reset_index(names="bank_index")
+        right = book_keys.sort_values("date", kind="stable").reset_index(names="book_index")
+        right["book_date"] = right["date"]
+        joined = pd.merge_asof(
+            left, right, on="date", by="amount_cents",
+            tolerance=tolerance, direction="nearest",
+        ).dropna(subset=["book_index"])
+        if joined.empty:
+            break
+        joined["book_index"] = joined["book_index"].astype(right["book_index"].dtype)
+        joined["day_delta"] = (joined["date"] - joined["book_date"]).abs() // pd.Timedelta(days=1)
+        # Greedy conflict resolution: each book row keeps its closest bank row
+        joined = joined.sort_values("day_delta", kind="stable").drop_duplicates("book_index")
+        matched.append(joined[["bank_index", "book_index", "day_delta"]])
+        bank_keys = bank_keys.drop(index=joined["bank_index"])
+        book_keys = book_keys.drop(index=joined["book_index"])
+
+    if not matched:
+        return [], bank_df.index, books_df.index
+    pairs = pd.concat(matched, ignore_index=True)
+    pairs = pairs.iloc[np.argsort(bank_df.index.get_indexer(pairs["bank_index"]), kind="stable")]
+    score = 100 - 100 * pairs["day_delta"].to_numpy() / (tolerance_days + 1)
+    matches = _build_match_records(bank_df, books_df, pairs["bank_index"], pairs["book_index"], score, "date_tolerance")
+    unmatched_bank = bank_df.index.difference(pd.Index(pairs["bank_index"]), sort=False)
+    unmatched_books = books_df.index.difference(pd.Index(pairs["book_index"]), sort=False)
+    return matches, unmatched_bank, unmatched_books
+
+
+def _subset_sums(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sums, sizes and bit masks of every subset of ``values``"""
+    masks = np.arange(1 << len(values), dtype="int64")
+    bits = (masks[:, None] >> np.arange(len(values))) & 1
+    return bits @ values, bits.sum(axis=1), masks
+
+
+def _find_subset(values: np.ndarray, target: int, max_size: int) -> List[int]:
+    """Smallest subset of 2..max_size values summing exactly to target, by meet-in-the-middle"""
+    half = len(values) // 2
+    left_sums, left_sizes, left_masks = _subset_sums(values[:half])
+    right_sums, right_sizes, right_masks = _subset_sums(values[half:])
+    order = np.argsort(right_sums, kind="stable")
+    right_sums, right_sizes, right_masks = right_sums[order], right_sizes[order], right_masks[order]
+    lo = np.searchsorted(right_sums, target - left_sums, side="left")
+    hi = np.searchsorted(right_sums, target - left_sums, side="right")
+    best = None
+    for i in np.nonzero(hi > lo)[0]:
+        sizes = left_sizes[i] + right_sizes[lo[i]:hi[i]]
+        valid = np.nonzero((sizes >= 2) & (sizes <= max_size))[0]
+        if len(valid):
+            j = valid[np.argmin(sizes[valid])]
+            if best is None or sizes[j] < best[0]:
+                best = (sizes[j], left_masks[i], right_masks[lo[i] + j])
+    if best is None:
+        return []
+    _, left_mask, right_mask = best
+    return [k for k in range(half) if left_mask >> k & 1] + [half + k for k in range(len(values) - half) if right_mask >> k & 1]
+
+
+def _split_groups(targets: pd.DataFrame, candidates: pd.DataFrame, date_window_days: int,
+                  max_candidates: int, max_size: int) -> List[Tuple]:
+    """Find groups of candidate rows whose amounts add up exactly to a target row"""
+    candidates = candidates.sort_values("date", kind="stable")
+    candidate_days = candidates["date"].to_numpy()
+    candidate_cents = candidates["amount_cents"].to_numpy()
+    candidate_labels = candidates.index.to_numpy()
+    available = np.ones(len(candidates), dtype=bool)
+    window = np.timedelta64(date_window_days, "D")
+
+    groups = []
+    for label, cents, day in zip(targets.index, targets["amount_cents"], targets["date"].to_numpy()):
+        lo = np.searchsorted(candidate_days, day - window, side="left")
+        hi = np.searchsorted(candidate_days, day + window, side="right")
+        # Same sign and strictly smaller in magnitude than the target
+        in_window = np.arange(lo, hi)[
+            available[lo:hi]
+            & (np.sign(candidate_cents[lo:hi]) == np.sign(cents))
+            & (np.abs(candidate_cents[lo:hi]) < abs(cents))
+        ]
+        if len(in_window) < 2:
+            continue
+        # Cap the search to the candidates closest in date, then sort the window by amount
+        closest = in_window[np.argsort(np.abs(candidate_days[in_window] - day), kind="stable")[:max_candidates]]
+        closest = closest[np.argsort(candidate_cents[closest], kind="stable")]
+        chosen = _find_subset(candidate_cents[closest], cents, max_size)
+        if chosen:
+            positions = np.sort(closest[chosen])
+            available[positions] = False
+            groups.append((label, candidate_labels[positions].tolist()))
+    return groups
+
+
+def _build_group_record(bank_df: pd.DataFrame, books_df: pd.DataFrame, bank_labels: List, book_labels: List) -> Dict:
+    """Build a grouped match dict for a split payment"""
+    bank_rows = bank_df.loc[bank_labels]
+    book_rows = books_df.loc[book_labels]
+    return {
+        "bank_indices": pd.Index(bank_labels).tolist(),
+        "book_indices": pd.Index(book_labels).tolist(),
+        "bank_transaction_ids": _column(bank_rows, "transaction_id").tolist(),
+        "book_transaction_ids": _column(book_rows, "transaction_id").tolist(),
+        "bank_descriptions": _column(bank_rows, "description").tolist(),
+        "book_descriptions": _column(book_rows, "description").tolist(),
+        "bank_amount": round(float(pd.to_numeric(bank_rows["amount"]).sum()), 2),
+        "book_amount": round(float(pd.to_numeric(book_rows["amount"]).sum()), 2),
+        "amount_match": True,
+        "score": 100.0,
+        "confidence": 1.0,
+        "match_type": "one_to_many" if len(bank_labels) == 1 else "many_to_one",
+    }
+
+
+def split_match(bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                date_window_days: int = DATE_WINDOW_DAYS,
+                max_candidates: int = SPLIT_MAX_CANDIDATES,
+                max_group_size: int = SPLIT_MAX_GROUP_SIZE) -> Tuple[List[Dict], pd.Index, pd.Index]:
+    """Match split payments: one bank row settling several book rows, or the reverse.
+
+    For every row, the other side's rows of the same sign within the date
+    window are capped to the ``max_candidates`` closest in date and searched
+    for a subset of at most ``max_group_size`` rows summing exactly to its
+    amount in cents. The meet-in-the-middle search enumerates
+    2 ** (max_candidates / 2) sums per half, so each group stays bounded.
+    """
+    if not {"amount", "date"} <= set(bank_df.columns) & set(books_df.columns):
+        return [], bank_df.index, books_df.index
+    bank_keys = _match_keys(bank_df)[["amount_cents", "date"]]
+    book_keys = _match_keys(books_df)[["amount_cents", "date"]]
+    bank_keys = bank_keys[bank_keys["amount_cents"] != 0]
+    book_keys = book_keys[book_keys["amount_cents"] != 0]
+
+    grouped = []
+    for bank_label, book_labels in _split_groups(bank_keys, book_keys, date_window_days, max_candidates, max_group_size):
+        grouped.append(_build_group_record(bank_df, books_df, [bank_label], book_labels))
+        book_keys = book_keys.drop(index=book_labels)
+        bank_keys = bank_keys.drop(index=bank_label)
+    for book_label, bank_labels in _split_groups(book_keys, bank_keys, date_window_days, max_candidates, max_group_size):
+        grouped.append(_build_group_record(bank_df, books_df, bank_labels, [book_label]))
+
+    matched_bank = [label for group in grouped for label in group["bank_indices"]]
+    matched_books = [label for group in grouped for label in group["book_indices"]]
+    unmatched_bank = bank_df.index.difference(pd.Index(matched_bank), sort=False)
+    unmatched_books = books_df.index.difference(pd.Index(matched_books), sort=False)
+    return grouped, unmatched_bank, unmatched_books
@@ -1,118 +1,650 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 import pandas as pd
-from typing import List, Dict
-from config import GOOGLE_API_KEY
+from typing import Callable, List, Dict, Optional, Tuple
+from config import MATCH_TOKEN_BUDGET, LLM_MAX_CONCURRENCY, DISCREPANCY_LLM_REASONS, FIX_CLUSTER_CHUNK_SIZE
 from dotenv import load_dotenv
 from agents.transaction_matching_agent import TransactionMatchingAgent
 from agents.discrepancy_detector_agent import DiscrepancyDetectorAgent
-from agents.auto_fix_suggestion_agent import AutoFixSuggestionAgent
-import json
-import re
+from agents.auto_fix_suggestion_agent import AutoFixSuggestionAgent, cluster_key, instantiate_fix
+from ingest import read_transactions
+from json_stream import parse_json_response
+from matching import exact_match, description_match, tolerance_match, assignment_match, split_match, DATE_WINDOW_DAYS
+import asyncio
+import threading
+from concurrent.futures import Executor, Future
+from functools import cached_property, partial
+
+# "llm": exact and description matching locally, LLM for the rest.
+# "tolerance": exact matching plus a date-tolerance join, no model call.
+# "assignment": exact matching plus a globally optimal scored 1:1 assignment, no model call.
+MATCHING_MODES = ("llm", "tolerance", "assignment")
+
+# Result stages in the order they are computed; each one depends on the previous
+STREAM_STAGES = ("matches", "unreconciled", "suggestions")
+
+
+_pipeline_loop = None
+_pipeline_loop_lock = threading.Lock()
+
+
+def run_coroutine(coroutine):
+    """Run a coroutine to completion from synchronous code.
+
+    Every call runs on one long-lived background event loop, so async LLM
+    clients (bound to the loop that first uses them) are reused across
+    calls instead of being left attached to a closed per-call loop. Safe to
+    call from threads that are themselves running an event loop.
+    """
+    global _pipeline_loop
+    with _pipeline_loop_lock:
+        if _pipeline_loop is None:
+            _pipeline_loop = asyncio.new_event_loop()
+            threading.Thread(target=_pipeline_loop.run_forever, name="reconciliation-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _pipeline_loop).result()
 
 class BankReconciliation:
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=GOOGLE_API_KEY,
-            temperature=0.7
-        )
-        self.transaction_matching_agent = TransactionMatchingAgent()
-        self.discrepancy_detector_agent = DiscrepancyDetectorAgent()
-        self.auto_fix_suggestion_agent = AutoFixSuggestionAgent()
-        
+    # Agents are built on first use, and only create the shared chat model when they call it
+    @cached_property
+    def transaction_matching_agent(self) -> TransactionMatchingAgent:
+        return TransactionMatchingAgent()
+
+    @cached_property
+    def discrepancy_detector_agent(self) -> DiscrepancyDetectorAgent:
+        return DiscrepancyDetectorAgent()
+
+    @cached_property
+    def auto_fix_suggestion_agent(self) -> AutoFixSuggestionAgent:
+        return AutoFixSuggestionAgent()
+
     def load_data(self, bank_statement_path: str, books_path: str) -> tuple:
         """Load bank statement and books data"""
-        bank_df = pd.read_csv(bank_statement_path)
-        books_df = pd.read_csv(books_path)
+        bank_df = read_transactions(bank_statement_path)
+        books_df = read_transactions(books_path)
         return bank_df, books_df
+
+    def load_bytes(self, bank_content: bytes, books_content: bytes) -> tuple:
+        """Load bank statement and books data straight from uploaded bytes"""
+        return read_transactions(bank_content), read_transactions(books_content)
     
-    def fuzzy_match_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame) -> List[Dict]:
-        """Match transactions using the TransactionMatchingAgent"""
-        llm_response = self.transaction_matching_agent.match_transactions(bank_df, books_df)
-        print(f"Raw LLM response: {llm_response}")  # Debug print
-        
-        # Extract the content string from the LLM response object
-        json_string = llm_response.content.strip()
-        print(f"JSON string after strip: {json_string}")  # Debug print
-        
-        # Remove markdown triple backticks and 'json' prefix if present
-        if json_string.startswith('```json'):
-            json_string = json_string[len('```json'):]
-        if json_string.endswith('```'):
-            json_string = json_string[:-len('```')]
-        json_string = json_string.strip()
-        print(f"JSON string after removing markdown: {json_string}")  # Debug print
-
-        # Use regex to find the first JSON object or array in the string
-        json_match = re.search(r'(\{.*\}|\[.*\])', json_string, re.DOTALL)
-        if json_match:
-            json_string = json_match.group(1)
-            print(f"JSON string after regex match: {json_string}")  # Debug print
+    def local_match_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, mode: str = "llm",
+                                 tolerance_days: int = DATE_WINDOW_DAYS) -> Tuple[List[Dict], List[Dict], pd.Index, pd.Index]:
+        """Run every matching stage that needs no LLM call.
+
+        Returns pairwise matches, grouped (split payment) matches and the
+        indices of the bank and book rows still unmatched.
+        """
+        if mode not in MATCHING_MODES:
+            raise ValueError(f"Unknown matching mode '{mode}', expected one of {MATCHING_MODES}")
+        matches, unmatched_bank, unmatched_books = exact_match(bank_df, books_df)
+        print(f"Exact pre-match: {len(matches)} matched, {len(unmatched_bank)} bank and {len(unmatched_books)} book rows left")
+
+        local_stages = {
+            "llm": lambda bank, books: description_match(bank, books, date_window_days=tolerance_days),
+            "tolerance": lambda bank, books: tolerance_match(bank, books, tolerance_days),
+            "assignment": lambda bank, books: assignment_match(bank, books, date_window_days=tolerance_days),
+        }
+        if len(unmatched_bank) and len(unmatched_books):
+            stage_matches, unmatched_bank, unmatched_books = local_stages[mode](
+                bank_df.loc[unmatched_bank], books_df.loc[unmatched_books]
+            )
+            matches += stage_matches
+            print(f"{mode} stage: {len(stage_matches)} matched, {len(unmatched_bank)} bank and {len(unmatched_books)} book rows left")
+
+        grouped_matches = []
+        if len(unmatched_bank) and len(unmatched_books):
+            grouped_matches, unmatched_bank, unmatched_books = split_match(
+                bank_df.loc[unmatched_bank], books_df.loc[unmatched_books], tolerance_days
+            )
+            print(f"Split payments: {len(grouped_matches)} grouped, {len(unmatched_bank)} bank and {len(unmatched_books)} book rows left")
+        return matches, grouped_matches, unmatched_bank, unmatched_books
+
+    def match_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                           mode: str = "llm", tolerance_days: int = DATE_WINDOW_DAYS,
+                           failures: Optional[List[str]] = None) -> Tuple[List[Dict], List[Dict]]:
+        """Return pairwise and grouped (split payment) matches, matching locally before any LLM call.
+
+        LLM calls that failed and were skipped are appended to ``failures``.
+        """
+        matches, grouped_matches, unmatched_bank, unmatched_books = self.local_match_transactions(
+            bank_df, books_df, mode, tolerance_days
+        )
+        if mode == "llm" and len(unmatched_bank) and len(unmatched_books):
+            matches += self.llm_match_transactions(
+                bank_df.loc[unmatched_bank], books_df.loc[unmatched_books], tolerance_days, failures
+            )
+        return matches, grouped_matches
+
+    def fuzzy_match_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                                 mode: str = "llm", tolerance_days: int = DATE_WINDOW_DAYS) -> List[Dict]:
+        """Match transactions locally first, sending only the rows left over to the LLM"""
+        matches, _ = self.match_transactions(bank_df, books_df, mode, tolerance_days)
+        return matches
+
+    def llm_match_transactions(self, bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                               tolerance_days: int = DATE_WINDOW_DAYS, failures: Optional[List[str]] = None) -> List[Dict]:
+        """Match transactions using the TransactionMatchingAgent.
+
+        Inputs whose prompt would exceed MATCH_TOKEN_BUDGET are split into
+        overlapping date windows that are sent concurrently, so latency tracks
+        the largest window rather than the whole file. A window that fails is
+        skipped and recorded in ``failures``.
+        """
+        agent = self.transaction_matching_agent
+        if agent.estimate_tokens(bank_df, books_df) <= MATCH_TOKEN_BUDGET:
+            return self._parse_matches(agent.match_transactions(bank_df, books_df))
+
+        windows = agent.partition(bank_df, books_df, MATCH_TOKEN_BUDGET, tolerance_days)
+        print(f"Matching {len(bank_df)} bank rows in {len(windows)} windows")
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+        async def match_window(bank_window: pd.DataFrame, books_window: pd.DataFrame) -> List[Dict]:
+            async with semaphore:
+                try:
+                    return self._parse_matches(await agent.amatch_transactions(bank_window, books_window))
+                except Exception as e:
+                    print(f"Error matching window of {len(bank_window)} bank rows: {e}")
+                    if failures is not None:
+                        failures.append(f"match window of {len(bank_window)} bank rows: {e}")
+                    return []
+
+        async def match_windows() -> List[List[Dict]]:
+            return await asyncio.gather(*(match_window(bank, books) for bank, books in windows))
+
+        return self._merge_window_matches(run_coroutine(match_windows()))
+
+    async def astream_llm_matches(self, bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                                  tolerance_days: int = DATE_WINDOW_DAYS, failures: Optional[List[str]] = None):
+        """Yield LLM matches as soon as the model has written each one.
+
+        Windows of a large input stream concurrently. Unlike the batch merge,
+        a transaction claimed by two windows goes to whichever match arrives
+        first, since earlier events have already been sent.
+        """
+        agent = self.transaction_matching_agent
+        if agent.estimate_tokens(bank_df, books_df) <= MATCH_TOKEN_BUDGET:
+            windows = [(bank_df, books_df)]
         else:
-            print(f"No valid JSON object or array found in LLM response (matches): {json_string}")
-            return []
+            windows = agent.partition(bank_df, books_df, MATCH_TOKEN_BUDGET, tolerance_days)
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        queue = asyncio.Queue()
+
+        async def stream_window(bank_window: pd.DataFrame, books_window: pd.DataFrame):
+            async with semaphore:
+                try:
+                    async for match in agent.astream_matches(bank_window, books_window):
+                        await queue.put(match)
+                except Exception as e:
+                    print(f"Error matching window of {len(bank_window)} bank rows: {e}")
+                    if failures is not None:
+                        failures.append(f"match window of {len(bank_window)} bank rows: {e}")
+            await queue.put(None)
 
+        tasks = [asyncio.create_task(stream_window(bank, books)) for bank, books in windows]
+        used_bank, used_books, pending = set(), set(), len(tasks)
         try:
-            parsed_json = json.loads(json_string)
-            print(f"Parsed JSON: {parsed_json}")  # Debug print
-            if isinstance(parsed_json, dict):
-                matches = parsed_json.get("matches", [])
-                print(f"Extracted matches from dict: {matches}")  # Debug print
-                return matches
-            elif isinstance(parsed_json, list):
-                print(f"Returning list directly: {parsed_json}")  # Debug print
-                return parsed_json
-            else:
-                print(f"Unexpected JSON type: {type(parsed_json)}")  # Debug print
-                return []
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON from LLM (matches): {e}")
-            print(f"Problematic JSON string (matches): {json_string}")
+            while pending:
+                match = await queue.get()
+                if match is None:
+                    pending -= 1
+                    continue
+                if not isinstance(match, dict):
+                    continue
+                bank_id = match.get("bank_transaction_id")
+                book_id = match.get("book_transaction_id")
+                if (bank_id is not None and bank_id in used_bank) or (book_id is not None and book_id in used_books):
+                    continue
+                used_bank.add(bank_id)
+                used_books.add(book_id)
+                yield match
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _merge_window_matches(window_matches: List[List[Dict]]) -> List[Dict]:
+        """Merge per-window matches, keeping each bank and book transaction at most once.
+
+        Book rows near window boundaries are seen by two windows, so the
+        highest-confidence match wins when both claim the same transaction.
+        """
+        def confidence(match: Dict) -> float:
+            try:
+                return float(match.get("confidence", 0))
+            except (TypeError, ValueError):
+                return 0.0
+
+        candidates = [match for matches in window_matches for match in matches if isinstance(match, dict)]
+        candidates.sort(key=confidence, reverse=True)
+        used_bank, used_books, merged = set(), set(), []
+        for match in candidates:
+            bank_id = match.get("bank_transaction_id")
+            book_id = match.get("book_transaction_id")
+            if (bank_id is not None and bank_id in used_bank) or (book_id is not None and book_id in used_books):
+                continue
+            used_bank.add(bank_id)
+            used_books.add(book_id)
+            merged.append(match)
+        return merged
+
+    def _parse_matches(self, llm_response) -> List[Dict]:
+        """Extract the list of matches from a TransactionMatchingAgent response"""
+        print(f"LLM match response: {len(llm_response.content)} characters")
+        parsed_json = parse_json_response(llm_response.content, "matches")
+        if isinstance(parsed_json, dict):
+            return parsed_json.get("matches", [])
+        elif isinstance(parsed_json, list):
+            return parsed_json
+        else:
+            print(f"Unexpected JSON type: {type(parsed_json)}")  # Debug print
             return []
     
-    def process_match_reconciliation(self, bank_df: pd.DataFrame, books_df: pd.DataFrame) -> Dict:
+    def process_match_reconciliation(self, bank_df: pd.DataFrame, books_df: pd.DataFrame,
+                                     mode: str = "llm", tolerance_days: int = DATE_WINDOW_DAYS,
+                                     failures: Optional[List[str]] = None) -> Dict:
         """Process only matched transactions"""
-        matches = self.fuzzy_match_transactions(bank_df, books_df)
-        print(f"Matches from fuzzy_match_transactions: {matches}")  # Debug print
-        return {"matches": matches if isinstance(matches, list) else []}
-
-    def process_unmatched_reconciliation(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict]) -> Dict:
-        """Process unreconciled transactions using the DiscrepancyDetectorAgent"""
-        unreconciled_items = self.discrepancy_detector_agent.detect_unreconciled_items(bank_df, books_df, matches)
-        # Ensure we return a dictionary with unreconciled items
-        if isinstance(unreconciled_items, list):
-            return {"unreconciled": unreconciled_items}
-        else:
-            return {"unreconciled": []}
+        matches, grouped_matches = self.match_transactions(bank_df, books_df, mode, tolerance_days, failures)
+        print(f"Matched {len(matches)} pairs and {len(grouped_matches)} split payments")
+        return {
+            "matches": matches if isinstance(matches, list) else [],
+            "grouped_matches": grouped_matches
+        }
+
+    def detect_discrepancies(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict],
+                             grouped_matches: Optional[List[Dict]] = None,
+                             tolerance_days: int = DATE_WINDOW_DAYS) -> List[Dict]:
+        """Detect discrepancies deterministically from the matches"""
+        return self.discrepancy_detector_agent.detect(bank_df, books_df, matches, grouped_matches, tolerance_days)
+
+    def process_unmatched_reconciliation(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict],
+                                         mode: str = "llm", grouped_matches: Optional[List[Dict]] = None,
+                                         failures: Optional[List[str]] = None,
+                                         tolerance_days: int = DATE_WINDOW_DAYS) -> Dict:
+        """Process unreconciled transactions using the DiscrepancyDetectorAgent.
 
-    def process_suggestions_for_fixes(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict]) -> List[Dict]:
+        Detection is always deterministic; in "llm" mode the LLM only rewrites
+        the reasons of ambiguous items (DISCREPANCY_LLM_REASONS).
+        """
+        unreconciled_items = self.detect_discrepancies(bank_df, books_df, matches, grouped_matches, tolerance_days)
+        if mode == "llm" and DISCREPANCY_LLM_REASONS:
+            unreconciled_items = self.discrepancy_detector_agent.enrich_reasons(unreconciled_items, failures)
+        return {"unreconciled": unreconciled_items}
+
+    def process_suggestions_for_fixes(self, bank_df: pd.DataFrame, books_df: pd.DataFrame, matches: List[Dict],
+                                      unreconciled_items: Optional[List[Dict]] = None,
+                                      failures: Optional[List[str]] = None) -> List[Dict]:
         """Generate auto-fix suggestions for unreconciled items"""
-        # First, detect unreconciled items
-        unreconciled_items = self.discrepancy_detector_agent.detect_unreconciled_items(bank_df, books_df, matches)
-        
-        auto_fixes = []
-        for discrepancy in unreconciled_items:
-            print(f"Processing discrepancy (type: {type(discrepancy)}, content: {discrepancy})")
-            suggestion = self.auto_fix_suggestion_agent.suggest_fixes(discrepancy)
-            auto_fixes.append({
-                "discrepancy": discrepancy,
-                "suggestion": suggestion
-            })
-        return auto_fixes
+        # First, detect unreconciled items unless the caller already has them
+        if unreconciled_items is None:
+            unreconciled_items = self.detect_discrepancies(bank_df, books_df, matches)
+
+        suggestions = self.suggest_fixes_concurrently(unreconciled_items, failures)
+        return [
+            {"discrepancy": discrepancy, "suggestion": suggestion}
+            for discrepancy, suggestion in zip(unreconciled_items, suggestions)
+        ]
+
+    def suggest_fixes_concurrently(self, discrepancies: List[Dict], failures: Optional[List[str]] = None) -> List:
+        """Suggest a fix for every discrepancy, in input order, via astream_fix_suggestions"""
+        async def suggest_all() -> List:
+            suggestions = [None] * len(discrepancies)
+            async for index, suggestion in self.astream_fix_suggestions(discrepancies, failures):
+                suggestions[index] = suggestion
+            return suggestions
+
+        if not discrepancies:
+            return []
+        return run_coroutine(suggest_all())
+
+    async def astream_fix_suggestions(self, discrepancies: List[Dict], failures: Optional[List[str]] = None):
+        """Yield (index, suggestion) pairs for discrepancies in completion order.
+
+        Discrepancies are grouped by cluster_key (type, sign, description
+        template, amount magnitude) and each cluster is split into chunks of
+        at most FIX_CLUSTER_CHUNK_SIZE members. The AutoFixSuggestionAgent is
+        asked once per cluster for a parameterized suggestion, with at most
+        LLM_MAX_CONCURRENCY requests at once, and every chunk of the cluster
+        fills it in for its own items. A failed request only affects its own
+        cluster, which gets a generic suggestion and is recorded in ``failures``.
+        """
+        agent = self.auto_fix_suggestion_agent
+        clusters = {}
+        for index, discrepancy in enumerate(discrepancies):
+            clusters.setdefault(cluster_key(discrepancy), []).append(index)
+        chunks = [
+            (key, indices[start:start + FIX_CLUSTER_CHUNK_SIZE])
+            for key, indices in clusters.items()
+            for start in range(0, len(indices), FIX_CLUSTER_CHUNK_SIZE)
+        ]
+        print(f"Suggesting fixes for {len(discrepancies)} discrepancies in {len(clusters)} clusters "
+              f"({len(chunks)} chunks)")
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        # One request per cluster, shared by all of its chunks
+        requests: Dict[Tuple, asyncio.Future] = {}
+
+        async def request(key: Tuple) -> Optional[str]:
+            async with semaphore:
+                try:
+                    return await agent.asuggest_cluster_fix(key)
+                except Exception as e:
+                    print(f"Error generating fix suggestion for cluster {key}: {e}")
+                    if failures is not None:
+                        failures.append(f"fix suggestion for cluster {key}: {e}")
+                    return None
+
+        async def suggest(key: Tuple, indices: List[int]) -> List[Tuple[int, object]]:
+            if key not in requests:
+                requests[key] = asyncio.ensure_future(request(key))
+            template = await asyncio.shield(requests[key])
+            if template is None:
+                return [(index, {"suggestion": "Could not generate a specific fix."}) for index in indices]
+            return [(index, instantiate_fix(template, discrepancies[index])) for index in indices]
+
+        tasks = [asyncio.create_task(suggest(key, indices)) for key, indices in chunks]
+        try:
+            for task in asyncio.as_completed(tasks):
+                for pair in await task:
+                    yield pair
+        finally:
+            for task in tasks:
+                task.cancel()
+            for future in requests.values():
+                future.cancel()
 
     def process_reconciliation(self, bank_statement_path: str, books_path: str) -> Dict:
         """Main reconciliation process"""
         # Load data
         bank_df, books_df = self.load_data(bank_statement_path, books_path)
-        
-        # Find matches
-        matches = self.fuzzy_match_transactions(bank_df, books_df)
-        print(f"Final matches from fuzzy_match_transactions: {matches[:2] if isinstance(matches, list) else matches}")
-        # Find unreconciled items
-        unreconciled = self.find_unreconciled_items(bank_df, books_df, matches)
-
+        job = ReconciliationJob(self, bank_df, books_df)
         return {
-            "matches": matches,
-            "unreconciled": unreconciled
-        }
\ No newline at end of file
+            "matches": job.matches()["matches"],
+            "unreconciled": job.unreconciled()["unreconciled"]
+        }
+
+
+class _StageRun:
+    """Events of a stage being streamed, replayed to every request following it.
+
+    The stage is produced once by a background task; followers get the events
+    published so far and then each new one as it arrives, on one event loop.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.get_running_loop().create_future()
+
+    def _notify(self):
+        if not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = asyncio.get_running_loop().create_future()
+
+    def publish(self, event: Dict):
+        self.events.append(event)
+        self._notify()
+
+    def finish(self, error: Optional[Exception] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self):
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed
+
+
+class ReconciliationJob:
+    """One reconciliation of a bank statement against the books.
+
+    Stages run lazily and at most once: matches feed unreconciled items, which
+    feed fix suggestions. Endpoints read whichever slices they need from the
+    same job instead of re-running earlier stages.
+    """
+
+    def __init__(self, engine: BankReconciliation, bank_df: Optional[pd.DataFrame] = None,
+                 books_df: Optional[pd.DataFrame] = None, mode: str = "llm",
+                 tolerance_days: int = DATE_WINDOW_DAYS, load_frames: Optional[Callable] = None,
+                 executor: Optional[Executor] = None):
+        if mode not in MATCHING_MODES:
+            raise ValueError(f"Unknown matching mode '{mode}', expected one of {MATCHING_MODES}")
+        self.engine = engine
+        self.mode = mode
+        self.tolerance_days = tolerance_days
+        self._bank_df = bank_df
+        self._books_df = books_df
+        # Frames can be loaded lazily, so a job restored from a snapshot only
+        # parses its input if a stage is missing from the snapshot
+        self._load_frames = load_frames
+        # Where streaming runs its blocking steps (None: the event loop's default executor)
+        self.executor = executor
+        # Guards the stage attributes only; it is never held while a stage is computed
+        self._lock = threading.RLock()
+        # Stages being computed by a thread, awaited by other threads that need them
+        self._computing: Dict[str, Future] = {}
+        # Stages currently being streamed, shared by concurrent requests for this job
+        self._stage_runs: Dict[str, _StageRun] = {}
+        self._matches = None
+        self._unreconciled = None
+        self._auto_fixes = None
+        # Stages (snapshot keys) computed while an LLM call failed and fell back
+        self._degraded = set()
+
+    @property
+    def bank_df(self) -> pd.DataFrame:
+        self._ensure_frames()
+        return self._bank_df
+
+    @property
+    def books_df(self) -> pd.DataFrame:
+        self._ensure_frames()
+        return self._books_df
+
+    def _ensure_frames(self):
+        # Checked without the lock first: streaming reads the frames on the event loop once loaded
+        if self._bank_df is not None and self._books_df is not None:
+            return
+        with self._lock:
+            if self._bank_df is None or self._books_df is None:
+                self._bank_df, self._books_df = self._load_frames()
+
+    def snapshot(self) -> Dict:
+        """The stages computed so far, as plain JSON-serializable data.
+
+        A degraded stage is left out, and so is every stage derived from it,
+        so a cached job never replays the result of a failed LLM call.
+        """
+        with self._lock:
+            snapshot = {}
+            for name, value in (("matches", self._matches), ("unreconciled", self._unreconciled),
+                                ("auto_fixes", self._auto_fixes)):
+                if name in self._degraded:
+                    break
+                if value is not None:
+                    snapshot[name] = value
+            return snapshot
+
+    @property
+    def degraded(self) -> bool:
+        """Whether a stage fell back after an LLM call failed, so the job should not be reused"""
+        return bool(self._degraded)
+
+    def _record_failures(self, stage: str, failures: List[str]):
+        if failures:
+            print(f"Stage {stage} degraded after {len(failures)} failed LLM calls; it will not be cached")
+            self._degraded.add(stage)
+
+    def restore(self, snapshot: Dict):
+        """Load previously computed stages from a snapshot"""
+        with self._lock:
+            self._matches = snapshot.get("matches", self._matches)
+            self._unreconciled = snapshot.get("unreconciled", self._unreconciled)
+            self._auto_fixes = snapshot.get("auto_fixes", self._auto_fixes)
+
+    def _store_stage(self, stage: str, value, failures: List[str]):
+        """Keep value for stage unless another request stored it first, and return the kept value"""
+        with self._lock:
+            if getattr(self, f"_{stage}") is None:
+                setattr(self, f"_{stage}", value)
+                self._record_failures(stage, failures)
+            return getattr(self, f"_{stage}")
+
+    def _compute_stage(self, stage: str, compute: Callable):
+        """The stage's value, computed once by the first thread that needs it.
+
+        compute(failures) runs outside the job lock, so a slow LLM call never
+        blocks other readers of the job; threads that need the same stage
+        meanwhile wait for the first one's result.
+        """
+        with self._lock:
+            value = getattr(self, f"_{stage}")
+            if value is not None:
+                return value
+            future = self._computing.get(stage)
+            owner = future is None
+            if owner:
+                future = self._computing[stage] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            failures = []
+            value = self._store_stage(stage, compute(failures), failures)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._computing.pop(stage, None)
+        return value
+
+    def matches(self) -> Dict:
+        """Matched transactions: {"matches": [...], "grouped_matches": [...]}"""
+        return self._compute_stage("matches", lambda failures: self.engine.process_match_reconciliation(
+            self.bank_df, self.books_df, self.mode, self.tolerance_days, failures
+        ))
+
+    def unreconciled(self) -> Dict:
+        """Unreconciled items: {"unreconciled": [...]}"""
+        def compute(failures: List[str]) -> Dict:
+            matched = self.matches()
+            return self.engine.process_unmatched_reconciliation(
+                self.bank_df, self.books_df, matched["matches"], self.mode, matched["grouped_matches"],
+                failures, self.tolerance_days
+            )
+        return self._compute_stage("unreconciled", compute)
+
+    def suggestions(self) -> Dict:
+        """Auto-fix suggestions: {"auto_fixes": [...]}"""
+        auto_fixes = self._compute_stage("auto_fixes", lambda failures: self.engine.process_suggestions_for_fixes(
+            self.bank_df, self.books_df, self.matches()["matches"], self.unreconciled()["unreconciled"], failures
+        ))
+        return {"auto_fixes": auto_fixes}
+
+    def result(self) -> Dict:
+        """Every stage in one response"""
+        return {**self.matches(), **self.unreconciled(), **self.suggestions()}
+
+    async def stream(self, stages: Tuple[str, ...] = STREAM_STAGES):
+        """Yield result events for the requested stages as soon as each item is known.
+
+        Events are dicts with an "event" name: "match" and "grouped_match"
+        (deterministic matches first, then "source": "llm" ones), "unreconciled",
+        "auto_fix" (with the item's "index"), "stage_complete" after each stage
+        and a final "done". Stages needed by later ones are computed silently;
+        stages already computed are replayed from the job.
+        """
+        await self._run_blocking(self._ensure_frames)
+        last_stage = max(STREAM_STAGES.index(stage) for stage in stages)
+        for stage in STREAM_STAGES[:last_stage + 1]:
+            async for event in self._shared_stage(stage):
+                if stage in stages:
+                    yield event
+            if stage in stages:
+                yield {"event": "stage_complete", "stage": stage}
+        yield {"event": "done"}
+
+    async def _run_blocking(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args))
+
+    async def _shared_stage(self, stage: str):
+        """Events of one stage, produced once however many requests stream it at the same time.
+
+        The first request starts the stage in a background task, so it keeps
+        running for the others if that request disconnects; later requests
+        replay the events published so far and then follow the live ones.
+        """
+        run = self._stage_runs.get(stage)
+        if run is None:
+            run = _StageRun()
+            self._stage_runs[stage] = run
+
+            async def produce():
+                error = None
+                try:
+                    async for event in getattr(self, f"_stream_{stage}")():
+                        run.publish(event)
+                except Exception as e:
+                    error = e
+                finally:
+                    self._stage_runs.pop(stage, None)
+                    run.finish(error)
+
+            asyncio.ensure_future(produce())
+        async for event in run.follow():
+            yield event
+
+    async def _stream_matches(self):
+        if self._matches is not None:
+            for match in self._matches["matches"]:
+                yield {"event": "match", "source": "llm" if "match_type" not in match else "local", "data": match}
+            for group in self._matches["grouped_matches"]:
+                yield {"event": "grouped_match", "source": "local", "data": group}
+            return
+
+        matches, grouped_matches, unmatched_bank, unmatched_books = await self._run_blocking(
+            self.engine.local_match_transactions, self.bank_df, self.books_df, self.mode, self.tolerance_days
+        )
+        for match in matches:
+            yield {"event": "match", "source": "local", "data": match}
+        for group in grouped_matches:
+            yield {"event": "grouped_match", "source": "local", "data": group}
+        failures = []
+        if self.mode == "llm" and len(unmatched_bank) and len(unmatched_books):
+            async for match in self.engine.astream_llm_matches(
+                self.bank_df.loc[unmatched_bank], self.books_df.loc[unmatched_books], self.tolerance_days, failures
+            ):
+                matches.append(match)
+                yield {"event": "match", "source": "llm", "data": match}
+        # The lock is a threading lock, so storing happens off the event loop
+        await self._run_blocking(
+            self._store_stage, "matches", {"matches": matches, "grouped_matches": grouped_matches}, failures
+        )
+
+    async def _stream_unreconciled(self):
+        if self._unreconciled is None:
+            await self._run_blocking(self.unreconciled)
+        for item in self._unreconciled["unreconciled"]:
+            yield {"event": "unreconciled", "data": item}
+
+    async def _stream_suggestions(self):
+        if self._auto_fixes is not None:
+            for index, fix in enumerate(self._auto_fixes):
+                yield {"event": "auto_fix", "index": index, "data": fix}
+            return
+
+        discrepancies = self._unreconciled["unreconciled"]
+        auto_fixes, failures = [None] * len(discrepancies), []
+        async for index, suggestion in self.engine.astream_fix_suggestions(discrepancies, failures):
+            auto_fixes[index] = {"discrepancy": discrepancies[index], "suggestion": suggestion}
+            yield {"event": "auto_fix", "index": index, "data": auto_fixes[index]}
+        await self._run_blocking(self._store_stage, "auto_fixes", auto_fixes, failures)
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class ResultCache:
+    """Two-tier cache for reconciliation results keyed by upload content.
+
+    The memory tier is an LRU of live objects (reconciliation jobs), so later
+    stages of a cached job are still computed at most once. The disk tier is a
+    SQLite table of JSON snapshots that survives restarts; when it grows past
+    ``max_bytes`` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, memory_items: int = 32, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(bank_content: bytes, books_content: bytes, *params: Any) -> str:
+        """SHA-256 of both uploads plus the parameters that change the result"""
+        digest = hashlib.sha256()
+        for part in (hashlib.sha256(bank_content).hexdigest(), hashlib.sha256(books_content).hexdigest(), *params):
+            digest.update(str(part).encode("utf-8") + b"\0")
+        return digest.hexdigest()
+
+    def get_memory(self, key: str) -> Optional[Any]:
+        """Return the live object for key from the memory tier"""
+        with self._lock:
+            if key not in self._memory:
+                return None
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+    def put_memory(self, key: str, value: Any):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def discard_memory(self, key: str, value: Any):
+        """Drop key from the memory tier if it still holds value"""
+        with self._lock:
+            if self._memory.get(key) is value:
+                del self._memory[key]
+
+    def get_disk(self, key: str) -> Optional[Dict]:
+        """Return the JSON snapshot for key from the disk tier"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put_disk(self, key: str, snapshot: Dict):
+        value = json.dumps(snapshot, default=str)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete least recently used snapshots until the table fits in max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
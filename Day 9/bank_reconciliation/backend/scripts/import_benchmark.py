@@ -0,0 +1,85 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Run in a fresh interpreter; each phase prints its wall time in seconds
+IMPORT_PROBE = """
+import time
+start = time.perf_counter()
+import api
+print("import", time.perf_counter() - start)
+"""
+# Builds what the first reconciliation and knowledge requests would
+FIRST_USE_PROBE = """
+start = time.perf_counter()
+api.reconciliation_engine.transaction_matching_agent.llm
+print("first_reconciliation_agent", time.perf_counter() - start)
+start = time.perf_counter()
+api.get_knowledge_agent()
+print("first_knowledge_agent", time.perf_counter() - start)
+"""
+
+
+def run_probe(first_use: bool) -> tuple:
+    """({phase: seconds}, [(cumulative_us, self_us, module)]) from one fresh interpreter"""
+    code = IMPORT_PROBE + FIRST_USE_PROBE if first_use else IMPORT_PROBE
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    timings = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] in ("import", "first_reconciliation_agent", "first_knowledge_agent"):
+            timings[parts[0]] = float(parts[1])
+    modules = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        modules.append((int(cumulative_us), int(self_us), module.rstrip()))
+    return timings, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report for the reconciliation API (python -X importtime)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--first-use", action="store_true", help="also time building the agents after import")
+    args = parser.parse_args()
+
+    # Warm the bytecode and filesystem caches outside the measurement
+    run_probe(False)
+    runs = [run_probe(args.first_use) for _ in range(args.runs)]
+    timings = defaultdict(list)
+    for run_timings, _ in runs:
+        for phase, seconds in run_timings.items():
+            timings[phase].append(seconds)
+    _, modules = runs[-1]
+
+    print(f"import api: {args.runs} fresh interpreters")
+    for phase, samples in timings.items():
+        print(f"  {phase:28s} median {statistics.median(samples) * 1000:8.1f}ms  max {max(samples) * 1000:8.1f}ms")
+
+    by_package = defaultdict(int)
+    for _, self_us, module in modules:
+        by_package[module.strip().split(".")[0]] += self_us
+    print(f"\nSelf time by top-level package (last run, top {args.top})")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {package:40s} {self_us / 1000:8.1f}ms")
+
+    print(f"\nSlowest imports by cumulative time (last run, top {args.top})")
+    for cumulative_us, _, module in sorted(modules, reverse=True)[:args.top]:
+        print(f"  {module.strip():40s} {cumulative_us / 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
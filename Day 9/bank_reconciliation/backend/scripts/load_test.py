@@ -0,0 +1,83 @@
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+
+def make_statements(rows: int, seed: int) -> tuple:
+    """A synthetic bank statement and matching books CSV, unique per seed so nothing is served from cache"""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 90, rows), unit="D")
+    amounts = rng.integers(-500000, 500000, rows) / 100
+    descriptions = rng.choice(["Vendor Payment", "Client Payment", "Office Rent", "Salary", "Service Fee"], rows)
+    bank = pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"),
+        "description": descriptions,
+        "amount": amounts,
+        "transaction_id": [f"BANK{seed}-{i}" for i in range(rows)],
+    })
+    books = bank.sample(frac=1, random_state=seed).assign(
+        transaction_id=[f"BOOK{seed}-{i}" for i in range(rows)]
+    )
+    # Shift some book dates and amounts so the non-exact stages have work to do
+    shifted = books.sample(frac=0.3, random_state=seed).index
+    books.loc[shifted, "date"] = (pd.to_datetime(books.loc[shifted, "date"]) + pd.Timedelta(days=2)).dt.strftime("%Y-%m-%d")
+    books.loc[books.sample(frac=0.05, random_state=seed + 1).index, "amount"] += 1
+    return bank.to_csv(index=False).encode(), books.to_csv(index=False).encode()
+
+
+def reconcile(url: str, endpoint: str, mode: str, bank: bytes, books: bytes) -> float:
+    files = {"bank_statement": ("bank.csv", bank, "text/csv"), "books": ("books.csv", books, "text/csv")}
+    start = time.perf_counter()
+    response = requests.post(f"{url}{endpoint}", params={"mode": mode}, files=files, timeout=600)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent reconciliation load test against a running API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/reconciliation/match")
+    parser.add_argument("--mode", default="assignment", help="'assignment' or 'tolerance' avoid Gemini calls")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    uploads = [make_statements(args.rows, seed) for seed in range(args.users)]
+    # Warm up imports and code paths outside the measurement
+    reconcile(args.url, args.endpoint, args.mode, *make_statements(50, 10_000 + int(time.time())))
+
+    health_latencies = []
+    done = threading.Event()
+
+    def poll_health():
+        while not done.is_set():
+            start = time.perf_counter()
+            requests.get(f"{args.url}/health", timeout=600)
+            health_latencies.append(time.perf_counter() - start)
+            time.sleep(0.05)
+
+    poller = threading.Thread(target=poll_health)
+    poller.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        latencies = list(executor.map(lambda upload: reconcile(args.url, args.endpoint, args.mode, *upload), uploads))
+    wall = time.perf_counter() - start
+    done.set()
+    poller.join()
+
+    print(f"{args.users} concurrent reconciliations of {args.rows} rows ({args.mode} mode)")
+    print(f"  wall time:          {wall:.2f}s")
+    print(f"  sum of latencies:   {sum(latencies):.2f}s (overlap x{sum(latencies) / wall:.2f})")
+    print(f"  request latency:    median {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s")
+    print(f"  /health during run: {len(health_latencies)} calls, median {statistics.median(health_latencies) * 1000:.0f}ms, "
+          f"max {max(health_latencies) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from typing import Dict, List
+
+import pandas as pd
+
+from ingest import public_columns
+from matching import to_cents
+
+# Rough characters-per-token ratio used to size prompts without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# transaction_id goes first so every row starts with its key
+KEY_COLUMN = "transaction_id"
+
+
+def _cell_strings(values: pd.Series) -> pd.Series:
+    """Column values as single-line strings that cannot break the row format"""
+    strings = values.astype("string").fillna("")
+    return strings.str.replace("|", "/", regex=False).str.replace(r"[\r\n\t]+", " ", regex=True)
+
+
+def encode_table(df: pd.DataFrame) -> str:
+    """Render transactions as a header line plus one pipe-delimited row each.
+
+    Unlike ``DataFrame.to_string`` there is no index and no column padding:
+    ``transaction_id`` leads each row as its key, dates are ``YYYY-MM-DD`` and
+    amounts are integer cents (the header names the column ``amount_cents``).
+    """
+    df = public_columns(df)
+    columns = [KEY_COLUMN] if KEY_COLUMN in df else []
+    columns += [column for column in df.columns if column != KEY_COLUMN]
+
+    header, cells = [], []
+    for column in columns:
+        if column == "amount":
+            header.append("amount_cents")
+            cells.append(to_cents(df[column]).astype("string").fillna(""))
+        elif column == "date":
+            header.append(column)
+            cells.append(pd.to_datetime(df[column], errors="coerce").dt.strftime("%Y-%m-%d").fillna(""))
+        else:
+            header.append(column)
+            cells.append(_cell_strings(df[column]))
+
+    return _join_rows(header, cells, len(df))
+
+
+def encode_rows(df: pd.DataFrame) -> str:
+    """Render any frame in the same header-once, pipe-delimited form, values as-is"""
+    return _join_rows([str(column) for column in df.columns], [_cell_strings(df[column]) for column in df.columns], len(df))
+
+
+def _join_rows(header: List[str], cells: List[pd.Series], rows: int) -> str:
+    lines = ["|".join(header)]
+    if rows and cells:
+        lines += cells[0].str.cat(cells[1:], sep="|").tolist()
+    return "\n".join(lines)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate size of text in tokens"""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def report_prompt(name: str, prompt: str, rows: int) -> Dict:
+    """Print and return the token count of a prompt about to be sent"""
+    tokens = estimate_tokens(prompt)
+    report = {
+        "prompt": name,
+        "tokens": tokens,
+        "rows": rows,
+        "tokens_per_row": round(tokens / rows, 1) if rows else None,
+    }
+    print(f"Prompt token report: {report}")
+    return report
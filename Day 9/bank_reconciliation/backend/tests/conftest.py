@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# The backend uses flat imports (run from backend/), so make them resolvable from any cwd
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+@pytest.fixture
+def frame():
+    """Factory for transaction frames: frame("BANK", dates, amounts) -> ids BANK0, BANK1, ..."""
+    def build(prefix, dates, amounts):
+        return pd.DataFrame({
+            "date": pd.to_datetime(dates),
+            "description": ["Vendor Payment"] * len(dates),
+            "amount": amounts,
+            "transaction_id": [f"{prefix}{i}" for i in range(len(dates))],
+        })
+
+    return build
@@ -0,0 +1,19 @@
+from ingest import DATE_DTYPE, missing_columns, read_transactions
+from matching import tolerance_match
+
+ISO_CSV = b"date,description,amount,transaction_id\n2024-01-03,Vendor Payment,-1500.00,BOOK0\n"
+NON_ISO_CSV = b"date,description,amount,transaction_id\n01/01/2024,Vendor Payment,-1500.00,BANK0\n"
+
+
+def test_mixed_date_formats_parse_to_one_unit():
+    bank = read_transactions(NON_ISO_CSV)
+    books = read_transactions(ISO_CSV)
+    assert bank["date"].dtype == books["date"].dtype == DATE_DTYPE
+
+    matches, _, _ = tolerance_match(bank, books, tolerance_days=5)
+    assert [(m["bank_transaction_id"], m["book_transaction_id"]) for m in matches] == [("BANK0", "BOOK0")]
+
+
+def test_missing_columns_reads_the_header_only():
+    assert missing_columns(ISO_CSV) == []
+    assert missing_columns(b"\xef\xbb\xbfdate, amount\n2024-01-03,-1500.00\n") == ["description", "transaction_id"]
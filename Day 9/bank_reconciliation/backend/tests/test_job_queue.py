@@ -0,0 +1,33 @@
+import time
+
+from job_queue import JobQueue, JobStore
+
+
+def test_queued_job_is_claimed_by_one_worker(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create(b"bank", b"books", "tolerance", 3)
+
+    assert store.claim(job_id, "worker-a")
+    assert not store.claim(job_id, "worker-b")
+    store.finish(job_id, "worker-b", result={"ok": False})
+    assert store.get(job_id)["status"] == "running"
+    store.finish(job_id, "worker-a", result={"ok": True})
+    assert store.get(job_id)["result"] == {"ok": True}
+
+
+def test_start_requeues_only_expired_leases(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    live, dead = store.create(b"bank", b"books", "tolerance", 3), store.create(b"bank", b"books", "tolerance", 3)
+    store.claim(live, "live-worker")
+    store.claim(dead, "dead-worker")
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 120, dead))
+
+    ran = []
+    queue = JobQueue(store, lambda job_id, *args: ran.append(job_id) or {}, workers=1, lease_seconds=60)
+    queue.start()
+    queue._queue.join()
+
+    assert ran == [dead]
+    assert store.get(dead)["status"] == "completed"
+    assert store.get(live)["status"] == "running"
@@ -0,0 +1,33 @@
+import json
+
+from json_stream import JSONStreamParser, parse_json_response
+
+RESPONSE = "Here are the matches:\n```json\n" + json.dumps({
+    "note": "ids like \"BANK1\", [not] {an} array",
+    "matches": [
+        {"bank_transaction_id": f"BANK{i}", "book_transaction_id": f"BOOK{i}", "reason": "same, \"amount\" [ok]"}
+        for i in range(50)
+    ],
+}) + "\n```"
+
+
+def _feed(text, size):
+    parser = JSONStreamParser("matches")
+    streamed = []
+    for start in range(0, len(text), size):
+        streamed += parser.feed(text[start:start + size])
+    return streamed, parser.close()
+
+
+def test_chunked_feed_matches_whole_parse():
+    whole = parse_json_response(RESPONSE, "matches")
+    for size in (1, 7, 40, len(RESPONSE)):
+        streamed, document = _feed(RESPONSE, size)
+        assert streamed == whole["matches"]
+        assert document == whole
+
+
+def test_truncated_response_keeps_completed_elements():
+    streamed, document = _feed(RESPONSE[:len(RESPONSE) // 2], 13)
+    assert document == {"matches": streamed}
+    assert streamed and streamed[-1]["bank_transaction_id"] == f"BANK{len(streamed) - 1}"
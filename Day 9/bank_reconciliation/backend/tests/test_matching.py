@@ -0,0 +1,54 @@
+import pandas as pd
+
+from matching import description_match, tolerance_match
+
+
+def _pairs(matches):
+    return {(m["bank_transaction_id"], m["book_transaction_id"]) for m in matches}
+
+
+def test_tolerance_match_skips_earlier_same_amount_row(frame):
+    bank = frame("BANK", ["2024-01-01", "2024-01-10"], [-1500.0, -1500.0])
+    books = frame("BOOK", ["2024-01-11"], [-1500.0])
+    matches, unmatched_bank, unmatched_books = tolerance_match(bank, books, tolerance_days=5)
+    assert _pairs(matches) == {("BANK1", "BOOK0")}
+    assert list(unmatched_bank) == [0]
+    assert unmatched_books.empty
+
+
+def test_tolerance_match_skips_earlier_same_amount_book_row(frame):
+    bank = frame("BANK", ["2024-01-11"], [-1500.0])
+    books = frame("BOOK", ["2024-01-01", "2024-01-10"], [-1500.0, -1500.0])
+    matches, unmatched_bank, unmatched_books = tolerance_match(bank, books, tolerance_days=5)
+    assert _pairs(matches) == {("BANK0", "BOOK1")}
+    assert unmatched_bank.empty
+    assert list(unmatched_books) == [0]
+
+
+def test_tolerance_match_gives_contested_book_row_to_closest_bank_row(frame):
+    bank = frame("BANK", ["2024-01-08", "2024-01-10"], [-1500.0, -1500.0])
+    books = frame("BOOK", ["2024-01-11", "2024-01-04"], [-1500.0, -1500.0])
+    matches, unmatched_bank, unmatched_books = tolerance_match(bank, books, tolerance_days=5)
+    assert _pairs(matches) == {("BANK1", "BOOK0"), ("BANK0", "BOOK1")}
+    assert unmatched_bank.empty and unmatched_books.empty
+
+
+def test_description_match_blocks_on_amount_tolerance(frame):
+    bank = frame("BANK", ["2024-01-01", "2024-01-01"], [-100.0, -100.0])
+    books = frame("BOOK", ["2024-01-02", "2024-01-02"], [-105.0, -150.0])
+    bank["description"] = ["Acme Supplies", "Globex Rent"]
+    books["description"] = ["ACME SUPPLIES", "Globex Rent"]
+    matches, unmatched_bank, unmatched_books = description_match(bank, books)
+    assert _pairs(matches) == {("BANK0", "BOOK0")}
+    assert list(unmatched_bank) == [1]
+    assert list(unmatched_books) == [1]
+
+
+def test_candidate_chunks_keep_pairs_across_dates(frame):
+    days = pd.date_range("2024-01-01", periods=60, freq="D")
+    bank = frame("BANK", days, [-1500.0] * 60)
+    books = frame("BOOK", days + pd.Timedelta(days=2), [-1500.0] * 60)
+    bank["description"] = books["description"] = [f"Invoice {i}" for i in range(60)]
+    matches, unmatched_bank, _ = description_match(bank, books, min_score=95)
+    assert _pairs(matches) == {(f"BANK{i}", f"BOOK{i}") for i in range(60)}
+    assert unmatched_bank.empty
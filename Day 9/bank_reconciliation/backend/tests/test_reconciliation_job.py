@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+from reconciliation import BankReconciliation, ReconciliationJob
+
+
+async def _fail(*args, **kwargs):
+    raise RuntimeError("no credentials")
+
+
+def test_snapshot_leaves_out_fallback_suggestions(monkeypatch, frame):
+    monkeypatch.setattr("agents.auto_fix_suggestion_agent.get_chat_model", lambda: SimpleNamespace(ainvoke=_fail))
+    engine = BankReconciliation()
+    bank = frame("BANK", ["2024-01-01", "2024-01-02"], [-1500.0, -20.0])
+    books = frame("BOOK", ["2024-01-01"], [-1500.0])
+    job = ReconciliationJob(engine, bank, books, mode="tolerance")
+
+    assert len(job.suggestions()["auto_fixes"]) == 1
+    assert job.degraded
+    assert set(job.snapshot()) == {"matches", "unreconciled"}
+
+
+def test_date_gap_within_tolerance_is_not_a_discrepancy(frame):
+    engine = BankReconciliation()
+    bank = frame("BANK", ["2024-01-01", "2024-01-01"], [-1500.0, -20.0])
+    books = frame("BOOK", ["2024-01-03", "2024-01-20"], [-1500.0, -20.0])
+    matches = [
+        {"bank_transaction_id": "BANK0", "book_transaction_id": "BOOK0", "score": 100},
+        {"bank_transaction_id": "BANK1", "book_transaction_id": "BOOK1", "score": 100},
+    ]
+    items = engine.detect_discrepancies(bank, books, matches, tolerance_days=3)
+    assert [(item["type"], item["bank_transaction_id"]) for item in items] == [("date_mismatch", "BANK1")]
+
+
+def test_lagged_tolerance_match_is_not_a_discrepancy(frame):
+    engine = BankReconciliation()
+    bank = frame("BANK", ["2024-01-01"], [-1500.0])
+    books = frame("BOOK", ["2024-01-03"], [-1500.0])
+    job = ReconciliationJob(engine, bank, books, mode="tolerance", tolerance_days=5)
+    matched = job.matches()["matches"]
+    assert [m["match_type"] for m in matched] == ["date_tolerance"] and matched[0]["score"] < 100
+    assert job.unreconciled()["unreconciled"] == []
+
+
+def test_large_cluster_is_filled_in_chunks_from_one_request(monkeypatch):
+    calls = []
+
+    async def _suggest(prompt):
+        calls.append(prompt)
+        return SimpleNamespace(content='{"suggestion": "Record {bank_transaction_id} in the books"}')
+
+    monkeypatch.setattr("agents.auto_fix_suggestion_agent.get_chat_model", lambda: SimpleNamespace(ainvoke=_suggest))
+    monkeypatch.setattr("reconciliation.FIX_CLUSTER_CHUNK_SIZE", 2)
+    engine = BankReconciliation()
+    discrepancies = [
+        {"type": "missing_in_books", "description": "Bank fee", "amount": -25.0, "bank_transaction_id": f"BANK{i}"}
+        for i in range(5)
+    ]
+    suggestions = engine.suggest_fixes_concurrently(discrepancies)
+    assert suggestions == [f"Record BANK{i} in the books" for i in range(5)]
+    assert len(calls) == 1
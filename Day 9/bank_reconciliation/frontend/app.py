@@ -5,6 +5,7 @@ import json
 from io import StringIO
 import os
 import re
+import time
 
 st.set_page_config(page_title="Bank Reconciliation System", layout="wide")
 
@@ -101,6 +102,99 @@ with col_select:
         disabled=not (bank_statement and books)
     )
 
+def matches_table(matches_list):
+    """Matched transactions as a display DataFrame"""
+    df_matches = pd.DataFrame(matches_list)
+
+    # Filter for transactions where amount_match is True
+    if 'amount_match' in df_matches.columns:
+        df_matches = df_matches[df_matches['amount_match'] == True]
+        
+    # Convert boolean amount_match to '✅' or '❌'
+    if 'amount_match' in df_matches.columns:
+        df_matches['Amount Match'] = df_matches['amount_match'].apply(lambda x: '✅' if x else '❌')
+        df_matches = df_matches.drop(columns=['amount_match'])
+
+    # Rename columns for better display
+    df_matches = df_matches.rename(columns={
+        'bank_transaction_id': 'Bank ID',
+        'book_transaction_id': 'Book ID',
+        'description_match': 'Description Match',
+        'book_description': 'Book Description',
+        'bank_amount': 'Bank Amount',
+        'book_amount': 'Book Amount',
+        'confidence': 'Confidence'
+    })
+    
+    # Reorder columns for better presentation
+    display_columns = [
+        'Bank ID',
+        'Book ID',
+        'Description Match',
+        'Book Description',
+        'Bank Amount',
+        'Book Amount',
+        'Amount Match',
+        'Confidence'
+    ]
+    
+    # Ensure only existing columns are used
+    return df_matches[[col for col in display_columns if col in df_matches.columns]]
+
+def grouped_table(grouped_list):
+    """Split payments as a display DataFrame"""
+    return pd.DataFrame([{
+        'Bank IDs': ', '.join(str(x) for x in group.get('bank_transaction_ids', [])),
+        'Book IDs': ', '.join(str(x) for x in group.get('book_transaction_ids', [])),
+        'Bank Amount': group.get('bank_amount'),
+        'Book Amount': group.get('book_amount'),
+        'Type': group.get('match_type')
+    } for group in grouped_list])
+
+def unreconciled_table(unreconciled_items):
+    """Unreconciled items as a display DataFrame"""
+    df_unreconciled = pd.DataFrame(unreconciled_items)
+
+    # Rename columns for better display
+    df_unreconciled = df_unreconciled.rename(columns={
+        'bank_transaction_id': 'Bank ID',
+        'book_transaction_id': 'Book ID',
+        'description': 'Description',
+        'bank_amount': 'Bank Amount',
+        'book_amount': 'Book Amount',
+        'reason': 'Reason/Discrepancy',
+        'type': 'Type'
+    })
+    
+    # Reorder columns for better presentation
+    display_columns = [
+        'Bank ID',
+        'Book ID',
+        'Description',
+        'Bank Amount',
+        'Book Amount',
+        'Type',
+        'Reason/Discrepancy'
+    ]
+    
+    # Ensure only existing columns are used
+    return df_unreconciled[[col for col in display_columns if col in df_unreconciled.columns]]
+
+def suggestions_table(auto_fixes):
+    """Auto-fix suggestions as a display DataFrame"""
+    suggestions_data = []
+    for fix in auto_fixes:
+        suggestions_data.append({
+            'Discrepancy Type': fix.get('discrepancy', {}).get('type', 'N/A'),
+            'Bank ID': fix.get('discrepancy', {}).get('bank_transaction_id', 'N/A'),
+            'Book ID': fix.get('discrepancy', {}).get('book_transaction_id', 'N/A'),
+            'Suggestion': fix.get('suggestion', 'N/A')
+        })
+    return pd.DataFrame(suggestions_data)
+
+# Minimum seconds between table refreshes while results stream in
+REFRESH_INTERVAL = 0.3
+
 if reconciliation_option != "Select an option" and bank_statement and books:
     try:
         files = {
@@ -110,128 +204,81 @@ if reconciliation_option != "Select an option" and bank_statement and books:
         
         endpoint = ""
         if reconciliation_option == "Match Reconciliation":
-            endpoint = "/reconciliation/match"
+            endpoint = "/reconciliation/match/stream"
         elif reconciliation_option == "Unmatched Reconciliation":
-            endpoint = "/reconciliation/unmatched"
+            endpoint = "/reconciliation/unmatched/stream"
         elif reconciliation_option == "Suggestion For Fixes":
-            endpoint = "/reconciliation/suggestions"
+            endpoint = "/reconciliation/suggestions/stream"
 
         if endpoint:
             st.session_state.processing_reconciliation = True  # Set flag to True
-            with st.spinner(f'Processing {reconciliation_option}...'):
-                response = requests.post(f"http://localhost:8000{endpoint}", files=files)
-            print(f"Frontend received response: {response}")
-            if response.status_code == 200:
-                result = response.json()
-                print(f"Frontend received response: {result}")  # Debug print
-                
-                # Display based on selected option
-                if reconciliation_option == "Match Reconciliation":
-                    matches_list = result.get('matches', [])
-                    print(f"Frontend matches list: {matches_list}")  # Debug print
-                    
-                    if not matches_list:
-                        st.write("No matched transactions found")
-                    else:
-                        st.subheader("Matched Transactions")
-                        # Prepare data for DataFrame
-                        df_matches = pd.DataFrame(matches_list)
-
-                        # Filter for transactions where amount_match is True
-                        if 'amount_match' in df_matches.columns:
-                            df_matches = df_matches[df_matches['amount_match'] == True]
-                            
-                        # Convert boolean amount_match to '✅' or '❌'
-                        if 'amount_match' in df_matches.columns:
-                            df_matches['Amount Match'] = df_matches['amount_match'].apply(lambda x: '✅' if x else '❌')
-                            df_matches = df_matches.drop(columns=['amount_match'])
-
-                        # Rename columns for better display
-                        df_matches = df_matches.rename(columns={
-                            'bank_transaction_id': 'Bank ID',
-                            'book_transaction_id': 'Book ID',
-                            'description_match': 'Description Match',
-                            'book_description': 'Book Description',
-                            'bank_amount': 'Bank Amount',
-                            'book_amount': 'Book Amount',
-                            'confidence': 'Confidence'
-                        })
-                        
-                        # Reorder columns for better presentation
-                        display_columns = [
-                            'Bank ID',
-                            'Book ID',
-                            'Description Match',
-                            'Book Description',
-                            'Bank Amount',
-                            'Book Amount',
-                            'Amount Match',
-                            'Confidence'
-                        ]
-                        
-                        # Ensure only existing columns are used
-                        df_matches = df_matches[[col for col in display_columns if col in df_matches.columns]]
-                        
-                        st.dataframe(df_matches, use_container_width=True, hide_index=True)
+            matches_list, grouped_list, unreconciled_items, auto_fixes = [], [], [], {}
 
+            # Tables are filled in progressively as events arrive
+            status = st.empty()
+            if reconciliation_option == "Match Reconciliation":
+                st.subheader("Matched Transactions")
+                matches_placeholder = st.empty()
+                grouped_header = st.empty()
+                grouped_placeholder = st.empty()
+            elif reconciliation_option == "Unmatched Reconciliation":
+                st.subheader("Unreconciled Items")
+                unreconciled_placeholder = st.empty()
+            else:
+                st.subheader("Auto-Fix Suggestions")
+                suggestions_placeholder = st.empty()
+
+            def render():
+                if reconciliation_option == "Match Reconciliation":
+                    if matches_list:
+                        matches_placeholder.dataframe(matches_table(matches_list), use_container_width=True, hide_index=True)
+                    if grouped_list:
+                        grouped_header.subheader("Split Payments")
+                        grouped_placeholder.dataframe(grouped_table(grouped_list), use_container_width=True, hide_index=True)
                 elif reconciliation_option == "Unmatched Reconciliation":
-                    unreconciled_items = result.get('unreconciled', [])
                     if unreconciled_items:
-                        st.subheader("Unreconciled Items")
-                        
-                        # Prepare data for DataFrame
-                        df_unreconciled = pd.DataFrame(unreconciled_items)
-
-                        # Rename columns for better display
-                        df_unreconciled = df_unreconciled.rename(columns={
-                            'bank_transaction_id': 'Bank ID',
-                            'book_transaction_id': 'Book ID',
-                            'description': 'Description',
-                            'bank_amount': 'Bank Amount',
-                            'book_amount': 'Book Amount',
-                            'reason': 'Reason/Discrepancy',
-                            'type': 'Type'
-                        })
-                        
-                        # Reorder columns for better presentation
-                        display_columns = [
-                            'Bank ID',
-                            'Book ID',
-                            'Description',
-                            'Bank Amount',
-                            'Book Amount',
-                            'Type',
-                            'Reason/Discrepancy'
-                        ]
-                        
-                        # Ensure only existing columns are used
-                        df_unreconciled = df_unreconciled[[col for col in display_columns if col in df_unreconciled.columns]]
-                        
-                        st.dataframe(df_unreconciled, use_container_width=True, hide_index=True)
-                    else:
-                        st.write("No unreconciled items found")
-
-                elif reconciliation_option == "Suggestion For Fixes":
-                    auto_fixes = result.get('auto_fixes', [])
-                    if auto_fixes:
-                        st.subheader("Auto-Fix Suggestions")
-                        
-                        # Prepare data for DataFrame
-                        suggestions_data = []
-                        for fix in auto_fixes:
-                            suggestions_data.append({
-                                'Discrepancy Type': fix.get('discrepancy', {}).get('type', 'N/A'),
-                                'Bank ID': fix.get('discrepancy', {}).get('bank_transaction_id', 'N/A'),
-                                'Book ID': fix.get('discrepancy', {}).get('book_transaction_id', 'N/A'),
-                                'Suggestion': fix.get('suggestion', 'N/A')
-                            })
-                        
-                        df_suggestions = pd.DataFrame(suggestions_data)
-                        
-                        st.dataframe(df_suggestions, use_container_width=True, hide_index=True)
-                    else:
-                        st.write("No auto-fix suggestions found")
+                        unreconciled_placeholder.dataframe(unreconciled_table(unreconciled_items), use_container_width=True, hide_index=True)
+                elif auto_fixes:
+                    ordered_fixes = [auto_fixes[index] for index in sorted(auto_fixes)]
+                    suggestions_placeholder.dataframe(suggestions_table(ordered_fixes), use_container_width=True, hide_index=True)
+
+            status.info(f'Processing {reconciliation_option}...')
+            response = requests.post(f"http://localhost:8000{endpoint}", files=files, stream=True)
+            print(f"Frontend received response: {response}")
+            if response.status_code == 200:
+                last_render = 0.0
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event['event'] == 'match':
+                        matches_list.append(event['data'])
+                        status.info(f"Processing {reconciliation_option}... {len(matches_list)} matches so far")
+                    elif event['event'] == 'grouped_match':
+                        grouped_list.append(event['data'])
+                    elif event['event'] == 'unreconciled':
+                        unreconciled_items.append(event['data'])
+                        status.info(f"Processing {reconciliation_option}... {len(unreconciled_items)} items so far")
+                    elif event['event'] == 'auto_fix':
+                        auto_fixes[event['index']] = event['data']
+                        status.info(f"Processing {reconciliation_option}... {len(auto_fixes)} suggestions so far")
+                    elif event['event'] == 'error':
+                        st.error(f"Error processing files: {event.get('detail')}")
+                    if event['event'] in ('stage_complete', 'done') or time.monotonic() - last_render > REFRESH_INTERVAL:
+                        render()
+                        last_render = time.monotonic()
+                render()
+                status.empty()
+
+                # Display based on selected option
+                if reconciliation_option == "Match Reconciliation" and not matches_list:
+                    matches_placeholder.write("No matched transactions found")
+                elif reconciliation_option == "Unmatched Reconciliation" and not unreconciled_items:
+                    unreconciled_placeholder.write("No unreconciled items found")
+                elif reconciliation_option == "Suggestion For Fixes" and not auto_fixes:
+                    suggestions_placeholder.write("No auto-fix suggestions found")
             else:
+                status.empty()
                 st.error(f"Error processing files: {response.text}")
         else:
             st.warning("Please select a reconciliation type.")
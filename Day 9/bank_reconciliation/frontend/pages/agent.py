@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 
 st.set_page_config(page_title="Knowledge Agent", layout="wide")
 
@@ -33,17 +34,46 @@ question = st.text_input("Ask a question about bank reconciliation:")
 # Create a button to submit the question
 if st.button("Ask"):
     if question:
-        with st.spinner("Processing your question..."):
-            try:
-                # Make request to the backend
-                response = requests.get(f"http://localhost:8000/ask-knowledge?question={question}")
-                if response.status_code == 200:
-                    answer = response.json().get("answer", "No answer found.")
-                    st.markdown("### Answer:")
-                    st.write(answer)
-                else:
-                    st.error("Failed to get an answer. Please try again.")
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
+        status = st.info("Searching the knowledge base...")
+        sources_placeholder = st.empty()
+        answer_header = st.empty()
+        answer_placeholder = st.empty()
+        try:
+            # Stream from the backend: sources arrive first, then the answer token by token
+            response = requests.get(
+                "http://localhost:8000/ask-knowledge/stream",
+                params={"question": question},
+                stream=True
+            )
+            if response.status_code == 200:
+                answer = ""
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event['event'] == 'sources':
+                        status.info("Generating answer...")
+                        with sources_placeholder.expander(f"Sources ({len(event['data'])})"):
+                            for source in event['data']:
+                                st.markdown(f"**{source['source']}**")
+                                st.caption(source['snippet'])
+                    elif event['event'] == 'token':
+                        answer += event['data']
+                        answer_header.markdown("### Answer:")
+                        answer_placeholder.markdown(answer + "▌")
+                    elif event['event'] == 'done':
+                        answer = event['answer'] or "No answer found."
+                    elif event['event'] == 'error':
+                        st.error(f"An error occurred: {event.get('detail')}")
+                status.empty()
+                if answer:
+                    answer_header.markdown("### Answer:")
+                    answer_placeholder.markdown(answer)
+            else:
+                status.empty()
+                st.error("Failed to get an answer. Please try again.")
+        except Exception as e:
+            status.empty()
+            st.error(f"An error occurred: {str(e)}")
     else:
-        st.warning("Please enter a question first.")
\ No newline at end of file
+        st.warning("Please enter a question first.")